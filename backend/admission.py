@@ -0,0 +1,133 @@
+import os
+import math
+import threading
+from collections import OrderedDict
+from rate_limiter import TokenBucketLimiter
+from metrics import ADMISSION_REJECTIONS, UPLOADS_IN_FLIGHT, SUGGESTION_REJECTIONS, SUGGESTIONS_IN_FLIGHT
+
+# Upload admission limits. They are enforced per worker process; with several
+# gunicorn workers the effective global limits scale with the worker count.
+MAX_REQUESTS_PER_MINUTE = int(os.getenv("MAX_REQUESTS_PER_MINUTE", 100))
+MAX_UPLOADS_PER_USER = int(os.getenv("MAX_UPLOADS_PER_USER", 2))
+MAX_INFLIGHT_UPLOADS = int(os.getenv("MAX_INFLIGHT_UPLOADS", 8))
+UPLOAD_RETRY_AFTER_SECONDS = int(os.getenv("UPLOAD_RETRY_AFTER_SECONDS", 30))
+# On-demand suggestion LLM calls are admitted separately, so opening risk
+# cards never spends a user's upload slots or upload rate
+MAX_SUGGESTION_REQUESTS_PER_MINUTE = int(os.getenv("MAX_SUGGESTION_REQUESTS_PER_MINUTE", 30))
+MAX_SUGGESTIONS_PER_USER = int(os.getenv("MAX_SUGGESTIONS_PER_USER", 3))
+MAX_INFLIGHT_SUGGESTIONS = int(os.getenv("MAX_INFLIGHT_SUGGESTIONS", 8))
+SUGGESTION_RETRY_AFTER_SECONDS = int(os.getenv("SUGGESTION_RETRY_AFTER_SECONDS", 5))
+# Per-user rate buckets kept in memory; least recently seen users are dropped first
+ADMISSION_MAX_TRACKED_USERS = 10000
+
+
+class AdmissionRejected(Exception):
+    """Raised when work is shed; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, status, reason, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.message = message
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+UPLOAD_MESSAGES = {
+    "user_concurrency": "You already have {limit} uploads in progress. Please wait for one to finish.",
+    "global_inflight": "The server is busy analyzing other documents. Please try again shortly.",
+    "user_rate": "Too many uploads. Please slow down."
+}
+SUGGESTION_MESSAGES = {
+    "user_concurrency": "You already have {limit} recommendations being generated. Please wait for one to finish.",
+    "global_inflight": "The server is busy generating other recommendations. Please try again shortly.",
+    "user_rate": "Too many recommendation requests. Please slow down."
+}
+
+
+class Admission:
+    """Decides whether new work may start, instead of letting it queue indefinitely.
+
+    A user over their request rate or concurrent cap gets 429; when the
+    process already runs max_inflight units of work everyone gets 503.
+    Admitted work holds a slot until release() is called when it finishes.
+    Each instance keeps its own counters and reports to its own in-flight
+    gauge and rejection counter.
+    """
+
+    def __init__(self, requests_per_minute, max_per_user, max_inflight, retry_after,
+                 messages, inflight_gauge, rejection_counter):
+        self.requests_per_minute = requests_per_minute
+        self.max_per_user = max_per_user
+        self.max_inflight = max_inflight
+        self.retry_after = retry_after
+        self.messages = messages
+        self._inflight_gauge = inflight_gauge
+        self._rejection_counter = rejection_counter
+        self._lock = threading.Lock()
+        self._rates = OrderedDict()
+        self._active = {}
+        self._inflight = 0
+        self._rejections = {}
+
+    def _rate_for(self, user_id):
+        limiter = self._rates.get(user_id)
+        if limiter is None:
+            # Only the request budget matters here; the token budget is unbounded
+            limiter = TokenBucketLimiter(self.requests_per_minute, 1)
+            self._rates[user_id] = limiter
+            if len(self._rates) > ADMISSION_MAX_TRACKED_USERS:
+                self._rates.popitem(last=False)
+        else:
+            self._rates.move_to_end(user_id)
+        return limiter
+
+    def _reject(self, status, reason, retry_after):
+        self._rejections[reason] = self._rejections.get(reason, 0) + 1
+        self._rejection_counter.labels(reason).inc()
+        message = self.messages[reason].format(limit=self.max_per_user)
+        raise AdmissionRejected(status, reason, message, retry_after)
+
+    def admit(self, user_id):
+        """Reserve a slot for user_id or raise AdmissionRejected."""
+        with self._lock:
+            if self._active.get(user_id, 0) >= self.max_per_user:
+                self._reject(429, "user_concurrency", self.retry_after)
+            if self._inflight >= self.max_inflight:
+                self._reject(503, "global_inflight", self.retry_after)
+            wait = self._rate_for(user_id).try_acquire()
+            if wait:
+                self._reject(429, "user_rate", wait)
+            self._active[user_id] = self._active.get(user_id, 0) + 1
+            self._inflight += 1
+            self._inflight_gauge.set(self._inflight)
+
+    def release(self, user_id):
+        with self._lock:
+            remaining = self._active.get(user_id, 0) - 1
+            if remaining > 0:
+                self._active[user_id] = remaining
+            else:
+                self._active.pop(user_id, None)
+            self._inflight = max(0, self._inflight - 1)
+            self._inflight_gauge.set(self._inflight)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "inflight": self._inflight,
+                "max_inflight": self.max_inflight,
+                "max_per_user": self.max_per_user,
+                "requests_per_minute": self.requests_per_minute,
+                "active_users": len(self._active),
+                "rejections": dict(self._rejections)
+            }
+
+
+upload_admission = Admission(
+    MAX_REQUESTS_PER_MINUTE, MAX_UPLOADS_PER_USER, MAX_INFLIGHT_UPLOADS, UPLOAD_RETRY_AFTER_SECONDS,
+    UPLOAD_MESSAGES, UPLOADS_IN_FLIGHT, ADMISSION_REJECTIONS
+)
+suggestion_admission = Admission(
+    MAX_SUGGESTION_REQUESTS_PER_MINUTE, MAX_SUGGESTIONS_PER_USER, MAX_INFLIGHT_SUGGESTIONS,
+    SUGGESTION_RETRY_AFTER_SECONDS, SUGGESTION_MESSAGES, SUGGESTIONS_IN_FLIGHT, SUGGESTION_REJECTIONS
+)
@@ -1,20 +1,41 @@
 import os
 import logging
-from flask import Flask
+import threading
+from flask import Flask, jsonify, request, g
 from flask_cors import CORS
-from pymongo import MongoClient
 from dotenv import load_dotenv
-from auth import auth
+from auth import auth, ensure_user_indexes
 from endpoints.risk_routes import risk_bp
+from jobs import ensure_job_indexes, fail_stale_jobs
+from history import ensure_history_indexes
+from utils import analysis_cache
+from db import ping
+from request_context import configure_logging, new_request_id, set_request_id, request_id_var
 from flask_jwt_extended import JWTManager
 
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app, origins=["https://frontend-xu5d.onrender.com", "http://localhost:3000"]) 
+CORS(app, origins=["https://frontend-xu5d.onrender.com", "http://localhost:3000"], expose_headers=["X-Request-ID"])
+
+@app.before_request
+def bind_request_id():
+    # Honour an id set by the proxy so logs can be joined across services
+    g.request_id_token = set_request_id(request.headers.get("X-Request-ID") or new_request_id())
+
+@app.after_request
+def add_request_id_header(response):
+    response.headers["X-Request-ID"] = request_id_var.get()
+    return response
+
+@app.teardown_request
+def reset_request_id(exc):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        request_id_var.reset(token)
 
 app.register_blueprint(auth, url_prefix='/api/auth')
 app.register_blueprint(risk_bp)
@@ -25,14 +46,33 @@ app.config["JWT_PRIVATE_KEY"] = os.getenv("JWT_PRIVATE_KEY")
 app.config["JWT_PUBLIC_KEY"] = os.getenv("JWT_PUBLIC_KEY")
 jwt = JWTManager(app)
 
-UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+startup_state = {"indexes_ready": False}
+
+def ensure_indexes():
+    # Runs off the import path so a slow or unreachable Mongo cannot hold up
+    # worker boot; /api/ready reports once it has finished
+    try:
+        ensure_user_indexes()
+        ensure_job_indexes()
+        # Jobs of a worker that died before this one started would otherwise
+        # sit in queued/running until their TTL expires
+        fail_stale_jobs()
+        ensure_history_indexes()
+        analysis_cache.ensure_indexes()
+        startup_state["indexes_ready"] = True
+    except Exception as e:
+        logger.warning(f"Could not create startup indexes: {e}")
+
+threading.Thread(target=ensure_indexes, name="ensure-indexes", daemon=True).start()
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-mongo_db = client.PassionInfotech  
+@app.route('/api/ready')
+def readiness_check():
+    """Readiness probe: Mongo reachable and startup indexes in place."""
+    mongo_ok = ping()
+    if mongo_ok and not startup_state["indexes_ready"]:
+        ensure_indexes()
+    ready = mongo_ok and startup_state["indexes_ready"]
+    return jsonify({"ready": ready, "mongo": mongo_ok, "indexes": startup_state["indexes_ready"]}), 200 if ready else 503
 
 @app.route('/')
 def index():
@@ -1,25 +1,27 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from db import collection
+from mailer import mail_sender
+from cache_utils import LRUCache
 import os
+import time
 import uuid  
 import jwt
 import random
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from datetime import datetime, timedelta
 import re
+import logging
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-mongo_db = client.PassionInfotech  # Changed to your Atlas DB name
-users_collection = mongo_db.users  # Now using a separate 'users' collection for authentication
+users_collection = collection("users")  # Separate collection for authentication
 
 # Define the auth blueprint
 auth = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
 
 # Secret key for JWT
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
@@ -30,6 +32,49 @@ MAX_OTP_ATTEMPTS = int(os.getenv("MAX_OTP_ATTEMPTS", 5))
 RESEND_COOLDOWN_SECONDS = int(os.getenv("RESEND_COOLDOWN_SECONDS", 60))
 MAX_LOGIN_ATTEMPTS = int(os.getenv("MAX_LOGIN_ATTEMPTS", 5))
 LOCKOUT_DURATION_MINUTES = int(os.getenv("LOCKOUT_DURATION_MINUTES", 15))
+# Profiles served to token-authenticated routes without a DB round-trip.
+# Invalidation is per process, so other workers may serve a profile up to
+# USER_CACHE_TTL_SECONDS old; 0 disables the cache.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 10000))
+
+# Never cache (or hand to route handlers) the password hash or OTP state
+USER_PROFILE_FIELDS = {"_id": 0, "user_id": 1, "name": 1, "email": 1}
+
+
+def ensure_user_indexes():
+    """Unique lookups by email (login, OTP flows) and user_id (token auth)."""
+    for field in ("email", "user_id"):
+        try:
+            users_collection.create_index(field, unique=True, name=f"{field}_unique")
+        except OperationFailure as e:
+            if e.code != 11000:
+                raise
+            # Existing duplicates must be cleaned up by hand; keep serving meanwhile
+            logger.error(f"Cannot create unique index on users.{field}; duplicate values exist: {e}")
+
+
+class UserCache:
+    """Thread-safe per-process TTL cache of user profiles keyed by user_id."""
+
+    def __init__(self, ttl_seconds=USER_CACHE_TTL_SECONDS, max_entries=USER_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self._entries = LRUCache(max_entries if ttl_seconds > 0 else 0)
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        user = users_collection.find_one({"user_id": user_id}, USER_PROFILE_FIELDS)
+        if user:
+            self._entries.set(user_id, (time.monotonic() + self.ttl_seconds, user))
+        return user
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id)
+
+
+user_cache = UserCache()
 
 def validate_email(email):
     """Validate email format"""
@@ -67,9 +112,6 @@ def register():
     if not is_valid:
         return jsonify({"error": message}), 400
 
-    if users_collection.find_one({"email": email}):
-        return jsonify({"error": "Email already exists"}), 400
-
     hashed_password = generate_password_hash(password)
     user_id = str(uuid.uuid4())  # Generate a unique user ID
     new_user = {
@@ -80,7 +122,11 @@ def register():
         "created_at": datetime.utcnow(),
         "email_verified": False
     }
-    users_collection.insert_one(new_user)
+    try:
+        # The unique email index settles concurrent registrations atomically
+        users_collection.insert_one(new_user)
+    except DuplicateKeyError:
+        return jsonify({"error": "Email already exists"}), 400
 
     return jsonify({
         "success": True,
@@ -122,7 +168,7 @@ def login():
 @jwt_required()
 def protected():
     current_user_id = get_jwt_identity()
-    user = users_collection.find_one({"user_id": current_user_id})
+    user = user_cache.get(current_user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
     
@@ -149,7 +195,7 @@ def token_required(f):
         
         try:
             data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            current_user = users_collection.find_one({'user_id': data['user_id']})
+            current_user = user_cache.get(data['user_id'])
         except:
             return jsonify({'error': 'Token is invalid'}), 401
             
@@ -158,12 +204,15 @@ def token_required(f):
 
 # Enhanced helper function to send OTP email with better formatting
 def send_otp_email(to_email, otp, user_name=None, purpose="login"):
-    """Send OTP email with improved formatting to avoid spam filters"""
+    """Queue an OTP email (formatted to avoid spam filters) for background delivery.
+
+    Returns True once the message is queued; delivery, retries and SMTP
+    errors are handled by the mail sender thread.
+    """
     sender_email = os.getenv("EMAIL_USER")
-    sender_password = os.getenv("EMAIL_PASS")
     
-    if not sender_email or not sender_password:
-        print("[ERROR] Email credentials not set in environment.")
+    if not sender_email:
+        logger.error("Email credentials not set in environment.")
         return False
     
     try:
@@ -292,25 +341,13 @@ This is an automated security message — please do not reply to this email.
         msg.attach(text_part)
         msg.attach(html_part)
         
-        # Send email with improved error handling
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, [to_email], msg.as_string())
-        
-        print(f"[SUCCESS] OTP email sent successfully to {to_email}")
-        return True
+        queued = mail_sender.enqueue(sender_email, [to_email], msg.as_string())
+        if queued:
+            logger.info(f"OTP email queued for {to_email}", extra={"purpose": purpose})
+        return queued
         
-    except smtplib.SMTPAuthenticationError:
-        print(f"[ERROR] SMTP Authentication failed. Check email credentials.")
-        return False
-    except smtplib.SMTPRecipientsRefused:
-        print(f"[ERROR] Recipient email address rejected: {to_email}")
-        return False
-    except smtplib.SMTPException as e:
-        print(f"[ERROR] SMTP error occurred: {e}")
-        return False
     except Exception as e:
-        print(f"[ERROR] Failed to send email: {e}")
+        logger.exception(f"Failed to build OTP email: {e}")
         return False
 
 @auth.route('/forgot-password', methods=['POST'])
@@ -408,7 +445,8 @@ def reset_password():
         }
     )
     
-    print(f"[SUCCESS] Password reset successful for user: {email}")
+    user_cache.invalidate(user["user_id"])
+    logger.info(f"Password reset successful for user: {email}")
     return jsonify({"success": True, "message": "Password reset successful. You can now log in with your new password."})
 
 # Optional: Add endpoint to resend OTP
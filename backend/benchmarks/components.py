@@ -0,0 +1,307 @@
+"""Micro-benchmarks for the upload pipeline's components, run against local fakes.
+
+Covers the upload pipeline as it runs: iter_text on generated PDF/DOCX/PPTX/TXT
+fixtures of increasing size, chunk_stream, parse_analysis_response on clean and
+malformed model output, FMEA scoring and suggest_fixes on 10k-100k risks,
+analyze_chunk_stream, and the history query path. LLM calls go through the real LLMClient to the in-process fake in
+fake_llm.py. Mongo is mongomock (pip install mongomock) unless --mongo-uri
+points at a local mongod. Timings are machine-specific, so the baseline is
+not committed: the first run records one locally and later runs with the
+same --quick/--llm-latency settings compare against it.
+
+    python benchmarks/components.py                   # compare to baseline
+    python benchmarks/components.py --save-baseline   # record a new baseline
+    python benchmarks/components.py --quick -k parse  # small sizes, one group
+    python benchmarks/components.py --output run.json # keep results for another commit
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import datetime
+import statistics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components_baseline.json")
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_llm import FakeLLMServer, fake_risk
+
+WORDS = (
+    "system data access security customer vendor contract deadline budget server network "
+    "encryption backup audit compliance policy release deployment integration latency outage "
+    "migration database credential approval review schedule dependency capacity incident"
+).split()
+
+# (full size, --quick size) per fixture
+SIZES = {
+    "pdf_pages": ([10, 100, 400], [5, 20]),
+    "docx_paragraphs": ([100, 1000, 5000], [50, 200]),
+    "pptx_slides": ([10, 100, 500], [5, 20]),
+    "txt_kb": ([100, 1000, 10000], [50, 200]),
+    "chunk_kb": ([100, 1000, 5000], [50, 200]),
+    "reports": ([1000, 10000], [100, 1000]),
+    "risks": ([10000, 100000], [1000, 5000]),
+    "chunks": ([50], [10]),
+    "history_entries": ([2000], [200])
+}
+
+
+def paragraph(rng, words=60):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_text(kb, seed=0):
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < kb * 1024:
+        parts.append(paragraph(rng))
+        size += len(parts[-1]) + 2
+    return "\n\n".join(parts)
+
+
+def make_pdf(pages):
+    import fitz
+    rng = random.Random(pages)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n\n".join(paragraph(rng) for _ in range(6)), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_docx(paragraphs):
+    import docx
+    rng = random.Random(paragraphs)
+    document = docx.Document()
+    for _ in range(paragraphs):
+        document.add_paragraph(paragraph(rng))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_pptx(slides):
+    from pptx import Presentation
+    from pptx.util import Inches
+    rng = random.Random(slides)
+    presentation = Presentation()
+    for _ in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+        slide.shapes.title.text = paragraph(rng, 6)
+        box = slide.shapes.add_textbox(Inches(1), Inches(2), Inches(8), Inches(4))
+        box.text_frame.text = paragraph(rng)
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+def make_responses(count, malformed=False):
+    """Per-chunk analysis responses as parse_analysis_response receives them from the model."""
+    reports = []
+    for i in range(count):
+        report = json.dumps(fake_risk(f"RISK-{i+1:03d}", seed=i))
+        if malformed:
+            kind = i % 4
+            if kind == 1:
+                report = f"```json\n{report}\n```"
+            elif kind == 2:
+                report = "Here is the analysis: " + report.replace('"', "'")
+            elif kind == 3:
+                report = report[:len(report) // 2]
+        reports.append(report)
+    return reports
+
+
+def make_risks(count):
+    return [fake_risk(f"RISK-{i+1:03d}", seed=i) for i in range(count)]
+
+
+def measure(fn, setup=None, repeat=5, warmup=1):
+    """Median/min wall time of fn(*setup()) in milliseconds; setup is not timed."""
+    times = []
+    for run in range(warmup + repeat):
+        args = setup(run) if setup else ()
+        started = time.perf_counter()
+        fn(*args)
+        elapsed = (time.perf_counter() - started) * 1000
+        if run >= warmup:
+            times.append(elapsed)
+    return {"median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3), "runs": repeat}
+
+
+def build_benchmarks(sizes):
+    import utils
+    import history
+    from scoring import apply_fmea_scores
+
+    benchmarks = []
+
+    def add(name, fn, setup=None, repeat=5, warmup=1):
+        benchmarks.append((name, fn, setup, repeat, warmup))
+
+    def extract(source, file_extension):
+        for _ in utils.iter_text(source, file_extension):
+            pass
+
+    def chunk(segments):
+        return list(utils.chunk_stream(segments))
+
+    def parse(responses):
+        return [utils.parse_analysis_response(content, idx) for idx, content in enumerate(responses)]
+
+    def analyze(chunks):
+        return utils.analyze_chunk_stream(enumerate(chunks))
+
+    for pages in sizes["pdf_pages"]:
+        data = make_pdf(pages)
+        add(f"extract_pdf[{pages}p]", extract, lambda run, d=data: (d, "pdf"), repeat=3)
+    for count in sizes["docx_paragraphs"]:
+        data = make_docx(count)
+        add(f"extract_docx[{count}para]", extract, lambda run, d=data: (d, "docx"), repeat=3)
+    for count in sizes["pptx_slides"]:
+        data = make_pptx(count)
+        add(f"extract_pptx[{count}slides]", extract, lambda run, d=data: (d, "pptx"), repeat=3)
+    for kb in sizes["txt_kb"]:
+        data = make_text(kb).encode()
+        add(f"extract_txt[{kb}KB]", extract, lambda run, d=data: (d, "txt"))
+
+    for kb in sizes["chunk_kb"]:
+        # Lines, as iter_text yields them for a .txt upload
+        lines = make_text(kb, seed=kb).split("\n")
+        add(f"chunk_stream[{kb}KB]", chunk, lambda run, l=lines: (l,), repeat=3)
+
+    for count in sizes["reports"]:
+        clean = make_responses(count)
+        malformed = make_responses(count, malformed=True)
+        add(f"parse_analysis_response[clean,{count}]", parse, lambda run, r=clean: (r,))
+        add(f"parse_analysis_response[malformed,{count}]", parse, lambda run, r=malformed: (r,))
+
+    for count in sizes["risks"]:
+        risks = make_risks(count)
+        copies = lambda run, r=risks: ([dict(risk) for risk in r],)
+        scored = lambda run, r=risks: (apply_fmea_scores([dict(risk) for risk in r]),)
+        add(f"apply_fmea_scores[{count}]", apply_fmea_scores, copies, repeat=3)
+        add(f"suggest_fixes[{count}]", utils.suggest_fixes, scored, repeat=1, warmup=0)
+
+    for count in sizes["chunks"]:
+        # Fresh text each run so the analysis cache never answers
+        chunks = lambda run, n=count: ([f"run {run} section {i}. " + paragraph(random.Random(i)) for i in range(n)],)
+        add(f"analyze_chunk_stream[{count}]", analyze, chunks, repeat=3)
+
+    for count in sizes["history_entries"]:
+        user_id = f"bench-{count}"
+        base = datetime.datetime(2024, 1, 1)
+        utils.history_collection.delete_many({"user_id": user_id})
+        utils.history_collection.insert_many([{
+            "user_id": user_id,
+            "file_name": f"document-{i}.pdf",
+            "description": "Benchmark upload",
+            "upload_date": base + datetime.timedelta(minutes=i),
+            "risk_summary": {"level": "High", "summary": "Benchmark", "details": make_risks(10)},
+            "chunks": [{"key": f"{i}-{c}", "risks": [c]} for c in range(10)]
+        } for i in range(count)])
+        first = history.list_history(user_id)[0][0]["id"]
+
+        def walk(user_id=user_id):
+            cursor = None
+            while True:
+                _, cursor = history.list_history(user_id, limit=history.HISTORY_MAX_PAGE_SIZE, cursor=cursor)
+                if not cursor:
+                    return
+
+        add(f"list_history[first page,{count}]", history.list_history, lambda run, u=user_id: (u,))
+        add(f"list_history[all pages,{count}]", walk, repeat=3)
+        add(f"get_history_entry[{count}]", history.get_history_entry, lambda run, u=user_id, e=first: (u, e))
+
+    return benchmarks
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and result["median_ms"] > previous["median_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: {result['median_ms']}ms vs baseline {previous['median_ms']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="small fixture sizes for a fast sanity run")
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="fake LLM reply delay in seconds")
+    parser.add_argument("--mongo-uri", help="benchmark against this mongod instead of mongomock")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed slowdown over the baseline median (0.5 = 50%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="also write results to this JSON file")
+    args = parser.parse_args()
+
+    fake = FakeLLMServer(args.llm_latency).start()
+    # Module-level config is read at import, so the environment must be set first
+    os.environ["LLM_BASE_URL"] = fake.base_url
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.environ["GROQ_REQUESTS_PER_MINUTE"] = "1000000000"
+    os.environ["GROQ_TOKENS_PER_MINUTE"] = "1000000000"
+    os.environ["MONGO_DB_NAME"] = "PassionInfotechBenchmark"
+    import db
+    if args.mongo_uri:
+        db.MONGO_URI = args.mongo_uri
+    else:
+        import mongomock
+        db.MongoClient = mongomock.MongoClient
+
+    # parse_analysis_response logs each malformed chunk; keep that out of the output
+    logging.getLogger().setLevel(logging.ERROR)
+    sizes = {key: quick if args.quick else full for key, (full, quick) in SIZES.items()}
+    results = {}
+    for name, fn, setup, repeat, warmup in build_benchmarks(sizes):
+        if args.pattern and args.pattern not in name:
+            continue
+        results[name] = measure(fn, setup, repeat, warmup)
+        print(f"{name:<45} median {results[name]['median_ms']:>10.2f} ms   min {results[name]['min_ms']:>10.2f} ms",
+              flush=True)
+    fake.stop()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "quick": args.quick,
+            "llm_latency": args.llm_latency,
+            "mongo": "mongod" if args.mongo_uri else "mongomock",
+            "llm_requests": fake.requests
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"].get("quick") != args.quick or baseline["meta"].get("llm_latency") != args.llm_latency:
+        print("Baseline was recorded with different --quick/--llm-latency settings; not comparing")
+        return 0
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
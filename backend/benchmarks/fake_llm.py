@@ -0,0 +1,142 @@
+"""In-process OpenAI-compatible chat completions server for benchmarks and load tests.
+
+Answers the prompts utils.py sends with canned, well-formed replies after a
+configurable delay, so the real LLMClient (pooling, retries, rate limiting)
+is exercised without network access or API quota. Point the backend at it
+with LLM_BASE_URL, or run it standalone:
+
+    python benchmarks/fake_llm.py --port 8081 --latency 0.3
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUGGESTION_TEXT = (
+    "TECHNICAL SOLUTIONS:\n"
+    "1. Access controls: Enforce least privilege on every service account.\n"
+    "2. Encryption: Encrypt data at rest and in transit.\n"
+    "\n"
+    "PROCESS & POLICY:\n"
+    "1. Review cadence: Audit permissions quarterly.\n"
+    "\n"
+    "GENERAL RECOMMENDATIONS:\n"
+    "1. Training: Brief the team on the new controls."
+)
+
+_SEVERITIES = ["Low", "Medium", "High", "Critical"]
+_PROBABILITIES = ["Low", "Medium", "High"]
+_CATEGORIES = ["Security", "Technical", "Operational", "Compliance"]
+_RISK_ID = re.compile(r'"RiskID": "(RISK-\d+)"')
+_SUGGESTION_IDS = re.compile(r"RiskID: (\S+)")
+
+
+def fake_risk(risk_id, seed=None):
+    """A risk report shaped like the analysis prompt asks for."""
+    rng = random.Random(seed)
+    return {
+        "RiskID": risk_id,
+        "RiskName": "Unencrypted customer data",
+        "RiskCategory": rng.choice(_CATEGORIES),
+        "RiskSeverity": rng.choice(_SEVERITIES),
+        "RiskDescription": "Customer records are stored without encryption. Logging is currently in place.",
+        "Probability": rng.choice(_PROBABILITIES),
+        "Impact": rng.choice(_PROBABILITIES),
+        "SecurityImplications": "Exposure of personal data",
+        "TechnicalMitigation": "Enable encryption and monitor access with alerts",
+        "NonTechnicalMitigation": "Data handling training",
+        "ContingencyPlan": "Incident response and customer notification"
+    }
+
+
+def reply_for(prompt, json_mode):
+    suggestion_ids = _SUGGESTION_IDS.findall(prompt)
+    if suggestion_ids:
+        return json.dumps({risk_id: SUGGESTION_TEXT for risk_id in suggestion_ids})
+    if json_mode:
+        match = _RISK_ID.search(prompt)
+        risk_id = match.group(1) if match else "RISK-001"
+        return json.dumps(fake_risk(risk_id, seed=prompt))
+    return SUGGESTION_TEXT
+
+
+class FakeLLMServer:
+    """Threaded HTTP server serving /chat/completions; usable as a context manager."""
+
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                json_mode = payload.get("response_format", {}).get("type") == "json_object"
+                content = reply_for(payload["messages"][-1]["content"], json_mode)
+                body = json.dumps({
+                    "id": "fake",
+                    "object": "chat.completion",
+                    "model": payload.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}]
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each reply")
+    args = parser.parse_args()
+    fake = FakeLLMServer(args.latency, args.host, args.port)
+    print(f"Fake LLM listening on {fake.base_url} (latency {args.latency}s)")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
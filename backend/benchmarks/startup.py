@@ -0,0 +1,106 @@
+"""Measure worker boot cost: `import app` time and time to the first /api/health response.
+
+Each run is a fresh interpreter, as with a gunicorn worker (re)start, and
+process_ms includes Python's own startup. Mongo is pointed at a closed port so
+any connection attempt on the import path shows up as a regression rather than
+being hidden by a fast local server. Timings are machine-specific, so the
+baseline is not committed: the first run records one locally and later runs
+compare against it.
+
+    python benchmarks/startup.py                  # measure and compare to baseline
+    python benchmarks/startup.py --save-baseline  # record a new baseline
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+# Modules that must only load on first use, never while a worker boots
+LAZY_MODULES = ["fitz", "pymupdf", "docx", "pptx", "requests", "numpy"]
+
+CHILD = """
+import sys, json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get("/api/health")
+answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_response_ms": (answered - started) * 1000,
+    "status": response.status_code,
+    "eager_modules": [m for m in %r if m in sys.modules]
+}), flush=True)
+""" % (LAZY_MODULES,)
+
+
+def run_once():
+    env = dict(os.environ, MONGO_URI="mongodb://127.0.0.1:1", PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    # Stop the clock when the child reports, not when it exits: interpreter
+    # shutdown (pymongo closing its monitors) is not part of boot
+    line = child.stdout.readline()
+    while line and not line.startswith("{"):
+        line = child.stdout.readline()  # skip anything the app prints while importing
+    process_ms = (time.perf_counter() - started) * 1000
+    child.wait()
+    if not line:
+        raise RuntimeError(f"startup child exited with {child.returncode} before responding")
+    sample = json.loads(line)
+    sample["process_ms"] = process_ms
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown over the baseline median (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+    report = {
+        key: round(statistics.median(s[key] for s in samples), 1)
+        for key in ("import_ms", "first_response_ms", "process_ms")
+    }
+    eager = sorted({m for s in samples for m in s["eager_modules"]})
+    statuses = {s["status"] for s in samples}
+    print(json.dumps({"runs": args.runs, "median": report, "eager_modules": eager}, indent=2))
+
+    failures = []
+    if eager:
+        failures.append(f"heavy modules imported at boot: {', '.join(eager)}")
+    if statuses != {200}:
+        failures.append(f"/api/health returned {sorted(statuses)}")
+
+    if args.save_baseline or not os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {BASELINE_PATH}")
+    else:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        for key, value in report.items():
+            limit = baseline[key] * (1 + args.tolerance)
+            if value > limit:
+                failures.append(f"{key} {value}ms exceeds baseline {baseline[key]}ms by more than {args.tolerance:.0%}")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU map."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max(0, int(max_entries))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
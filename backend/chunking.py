@@ -0,0 +1,203 @@
+import re
+import zlib
+from collections import Counter
+from rate_limiter import estimate_tokens
+
+# Lines repeated at least this often (page headers, footers, running titles)
+# are treated as boilerplate and dropped before chunking
+REPEATED_LINE_MIN_COUNT = 3
+REPEATED_LINE_MAX_CHARS = 80
+# Streaming: lines held back to learn the repeated ones before anything is
+# emitted, and the most distinct short lines counted afterwards
+BOILERPLATE_SAMPLE_LINES = 2000
+REPEATED_LINE_MAX_TRACKED = 50000
+# A paragraph this many chunk budgets long is split before its end is seen
+PARAGRAPH_FLUSH_FACTOR = 4
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+_PAGE_NUMBER = re.compile(r"^(page\s*)?\d+(\s*(of|/)\s*\d+)?$", re.IGNORECASE)
+
+
+def _split_oversized(unit, max_tokens):
+    """Break a unit larger than the budget into sentences, then hard slices."""
+    pieces = []
+    for sentence in _SENTENCE_BOUNDARY.split(unit):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        width = max(1, (max_tokens - 1) * 4)
+        pieces.extend(sentence[i:i + width] for i in range(0, len(sentence), width))
+    return pieces
+
+
+def _is_anchor(unit, anchor_divisor):
+    # crc32 rather than hash() so anchors are identical across processes
+    return anchor_divisor > 0 and zlib.crc32(unit.encode("utf-8")) % anchor_divisor == 0
+
+
+def _segment_lines(segments):
+    # Same lines as "\n".join(segments).splitlines(), without building the
+    # join; each line comes with the index of the segment it came from
+    for number, segment in enumerate(segments):
+        for part in segment.split("\n"):
+            for line in part.splitlines() or [""]:
+                yield number, line
+
+
+def _clean_lines(segments, stats):
+    """Yield (segment index, cleaned line) pairs, with "" lines between paragraphs.
+
+    Whitespace is collapsed and repeated header/footer lines and page numbers
+    are dropped. Repeated lines are learned from the first
+    BOILERPLATE_SAMPLE_LINES lines, which are held back until the sample is
+    complete; after that each line is judged on the counts seen so far.
+    """
+    counts = Counter()
+    sample = []
+    removed = 0
+
+    def is_boilerplate(line):
+        return line and (_PAGE_NUMBER.match(line) or counts[line] >= REPEATED_LINE_MIN_COUNT)
+
+    def count(line):
+        if line and len(line) <= REPEATED_LINE_MAX_CHARS and (line in counts or len(counts) < REPEATED_LINE_MAX_TRACKED):
+            counts[line] += 1
+
+    for number, raw in _segment_lines(segments):
+        stats["input_chars"] += len(raw) + 1
+        line = re.sub(r"[ \t\f\v\xa0]+", " ", raw).strip()
+        count(line)
+        if sample is not None:
+            sample.append((number, line))
+            if len(sample) < BOILERPLATE_SAMPLE_LINES:
+                continue
+            lines, sample = sample, None
+        else:
+            lines = ((number, line),)
+        for number, line in lines:
+            if is_boilerplate(line):
+                removed += 1
+                continue
+            stats["cleaned_chars"] += len(line) + 1
+            yield number, line
+    for number, line in sample or ():
+        if is_boilerplate(line):
+            removed += 1
+            continue
+        stats["cleaned_chars"] += len(line) + 1
+        yield number, line
+    stats["removed_lines"] = removed
+
+
+def _stream_units(lines, max_tokens):
+    """Yield the cleaned text's packing units, a paragraph at a time, as (unit, first, last).
+
+    A paragraph that fits the budget is one unit; a larger one is split into
+    sentences, then hard slices (see _split_oversized). first and last are
+    the indexes of the segments the unit's paragraph starts and ends in. A
+    paragraph growing past PARAGRAPH_FLUSH_FACTOR budgets is already known to
+    be oversized, so its complete sentences are emitted and only the trailing
+    partial sentence is kept.
+    """
+    paragraph = []
+    paragraph_chars = 0
+    oversized = False
+    first = last = 0
+    flush_chars = PARAGRAPH_FLUSH_FACTOR * max_tokens * 4
+
+    def finish(text, partial):
+        pieces = _split_oversized(text, max_tokens)
+        if partial:
+            return pieces[:-1], pieces[-1]
+        return pieces, None
+
+    def complete():
+        text = "\n".join(paragraph)
+        if not oversized and estimate_tokens(text) <= max_tokens:
+            return [text]
+        return finish(text, partial=False)[0]
+
+    for number, line in lines:
+        if line:
+            if not paragraph:
+                first = number
+            last = number
+            paragraph.append(line)
+            paragraph_chars += len(line) + 1
+            if paragraph_chars > flush_chars:
+                pieces, tail = finish("\n".join(paragraph), partial=True)
+                for piece in pieces:
+                    yield piece, first, last
+                paragraph, paragraph_chars, oversized = [tail], len(tail), True
+                first = last
+            continue
+        if paragraph:
+            for piece in complete():
+                yield piece, first, last
+            paragraph, paragraph_chars, oversized = [], 0, False
+    if paragraph:
+        for piece in complete():
+            yield piece, first, last
+
+
+def iter_chunks(segments, max_tokens, overlap_tokens=0, anchor_divisor=0, stats=None, spans=None):
+    """Pack paragraphs (and sentences of oversized paragraphs) into token-budgeted chunks.
+
+    segments is any iterable of text pieces (pages, paragraphs, lines) that
+    together form the document as if joined with newlines; it is consumed
+    lazily, so only the chunk being packed and the held-back boilerplate
+    sample are in memory at a time.
+
+    Consecutive chunks share up to overlap_tokens of trailing units so risks
+    spanning a boundary are seen whole at least once. With anchor_divisor set,
+    a chunk that is at least half full also ends after any unit whose content
+    hash is divisible by it; these content-defined boundaries keep an edit from
+    shifting every later chunk, so unchanged text re-chunks identically.
+    If given, stats is filled in once the generator is exhausted, and spans
+    gets the (first, last) segment indexes of each chunk appended before the
+    chunk is yielded; for a PDF, whose segments are pages, those are its pages.
+    """
+    stats = {} if stats is None else stats
+    stats.update(input_chars=0, cleaned_chars=0, removed_lines=0)
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    token_counts = []
+    current = []
+    current_tokens = 0
+
+    def emit(units):
+        chunk = "\n\n".join(unit for unit, _, _ in units)
+        token_counts.append(estimate_tokens(chunk))
+        if spans is not None:
+            spans.append((min(first for _, first, _ in units), max(last for _, _, last in units)))
+        return chunk
+
+    for unit in _stream_units(_clean_lines(segments, stats), max_tokens):
+        unit_tokens = estimate_tokens(unit[0])
+        if current and current_tokens + unit_tokens > max_tokens:
+            yield emit(current)
+            carried = []
+            carried_tokens = 0
+            for previous in reversed(current):
+                previous_tokens = estimate_tokens(previous[0])
+                if carried_tokens + previous_tokens > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_tokens
+            if carried_tokens + unit_tokens > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += unit_tokens
+        if current_tokens * 2 >= max_tokens and _is_anchor(unit[0], anchor_divisor):
+            yield emit(current)
+            current, current_tokens = [], 0
+    if current:
+        yield emit(current)
+    stats.update(
+        chunks=len(token_counts),
+        total_tokens=sum(token_counts),
+        max_chunk_tokens=max(token_counts, default=0),
+        mean_chunk_tokens=round(sum(token_counts) / len(token_counts), 1) if token_counts else 0,
+        max_tokens=max_tokens,
+        overlap_tokens=overlap_tokens
+    )
@@ -0,0 +1,109 @@
+import re
+from prefilter import STOPWORDS
+from scoring import severity_score, standard_severity
+
+_WORD = re.compile(r"[a-z][a-z0-9'-]+")
+_SUFFIXES = ("ies", "ing", "ed", "es", "s")
+
+
+def _stem(word):
+    # Just enough stemming that "breach"/"breaches"/"breached" share a term
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def _terms(risk):
+    # The name is counted twice: it is the most telling part of a restatement
+    name = str(risk.get("RiskName", ""))
+    text = f"{name} {name} {risk.get('RiskDescription', '')}".lower()
+    return [_stem(word) for word in _WORD.findall(text) if word not in STOPWORDS]
+
+
+def tfidf_matrix(risks):
+    """Row-normalised TF-IDF vectors of each risk's name and description."""
+    import numpy as np  # deferred like scoring.py
+    documents = [_terms(risk) for risk in risks]
+    vocabulary = {}
+    for terms in documents:
+        for term in terms:
+            vocabulary.setdefault(term, len(vocabulary))
+    counts = np.zeros((len(documents), max(1, len(vocabulary))), dtype=np.float32)
+    for row, terms in enumerate(documents):
+        for term in terms:
+            counts[row, vocabulary[term]] += 1
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+    vectors = counts * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def cluster_risks(risks, threshold):
+    """Group risks whose TF-IDF cosine similarity to a cluster's leader is at least threshold.
+
+    Risks are visited from most to least severe and each joins the first
+    cluster whose leader it resembles, so every leader is the most severe
+    member of its cluster and similarity never chains through intermediaries.
+    Returns clusters as lists of indices into risks, leader first.
+    """
+    if not risks:
+        return []
+    similarity = tfidf_matrix(risks)
+    similarity = similarity @ similarity.T
+    order = sorted(range(len(risks)),
+                   key=lambda i: -severity_score(standard_severity(risks[i].get("RiskSeverity"))))
+    clusters = []
+    for i in order:
+        for cluster in clusters:
+            if similarity[cluster[0], i] >= threshold:
+                cluster.append(i)
+                break
+        else:
+            clusters.append([i])
+    return clusters
+
+
+def merge_cluster(risks, cluster, chunk_numbers, chunk_pages=None):
+    """Merge one cluster into its leader's risk dict.
+
+    chunk_numbers holds each risk's 1-based source chunks. The merged risk
+    keeps the leader's (highest) severity and scores, lists every source
+    chunk of the cluster in SourceChunks (and, given chunk_pages of
+    (first, last) 0-based page indexes per chunk index, every 1-based page
+    those chunks cover in SourcePages), the other members' names in
+    MergedRisks, and takes an existing suggestion from a member at the same
+    action level when the leader has none. Members that were themselves merged
+    (carried over from a previous version) contribute their MergedRisks too;
+    the list holds each name once and never the leader's own.
+    """
+    leader = dict(risks[cluster[0]])
+    leader["SourceChunks"] = sorted({number for i in cluster for number in chunk_numbers[i]})
+    if chunk_pages:
+        spans = [chunk_pages[number - 1] for number in leader["SourceChunks"]]
+        leader["SourcePages"] = sorted({page + 1 for first, last in spans for page in range(first, last + 1)})
+    else:
+        # Pages carried over from a previous version may no longer match
+        leader.pop("SourcePages", None)
+    members = [risks[i] for i in cluster[1:]]
+    names = list(leader.get("MergedRisks", []))
+    for risk in members:
+        names.append(risk.get("RiskName", "Unnamed Risk"))
+        names.extend(risk.get("MergedRisks", []))
+    leader_name = leader.get("RiskName", "Unnamed Risk")
+    merged = [name for name in dict.fromkeys(names) if name != leader_name]
+    if merged:
+        leader["MergedRisks"] = merged
+    else:
+        leader.pop("MergedRisks", None)
+    if "SuggestedFix" not in leader and "FMEA" in leader:
+        # A suggestion carried over from a previous version covers the whole
+        # cluster, provided it was written for the same action level
+        donor = next((risk for risk in members if "SuggestedFix" in risk
+                      and risk.get("ActionLevel") == leader.get("ActionLevel")), None)
+        if donor is not None:
+            leader["SuggestedFix"] = donor["SuggestedFix"]
+            leader["FMEA"] = dict(leader["FMEA"], RecommendedActions=donor.get("FMEA", {}).get("RecommendedActions", []))
+    return leader
@@ -0,0 +1,158 @@
+import os
+import threading
+import pymongo
+from pymongo import MongoClient, monitoring
+from dotenv import load_dotenv
+from metrics import MONGO_COMMAND_SECONDS, MONGO_COMMAND_FAILURES
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "PassionInfotech")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 20))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "majority")
+MONGO_PING_TIMEOUT_SECONDS = float(os.getenv("MONGO_PING_TIMEOUT_SECONDS", 1))
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Counts connection pool events for this process's client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checkout_failures = 0
+
+    def _bump(self, name, delta=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def connection_created(self, event):
+        self._bump("created")
+
+    def connection_closed(self, event):
+        self._bump("closed")
+
+    def connection_check_out_failed(self, event):
+        self._bump("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._bump("checked_out")
+
+    def connection_checked_in(self, event):
+        self._bump("checked_out", -1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open_connections": self.created - self.closed,
+                "in_use": self.checked_out,
+                "created": self.created,
+                "closed": self.closed,
+                "checkout_failures": self.checkout_failures
+            }
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Feeds every MongoDB command's duration into the metrics histogram."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name).inc()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+pool_stats = PoolStats()
+
+
+def _write_concern(value):
+    return int(value) if value.isdigit() else value
+
+
+def get_client():
+    """Return this process's MongoClient, creating it on first use after fork.
+
+    Every blueprint shares the one client, so a gunicorn worker holds a
+    single connection pool no matter how many modules talk to Mongo.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                # A client inherited from the parent process must not be used
+                # or closed in the child; just drop the reference
+                pool_stats.reset()
+                _client = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    w=_write_concern(MONGO_WRITE_CONCERN),
+                    event_listeners=[pool_stats, CommandTimer()]
+                )
+                _client_pid = pid
+    return _client
+
+
+def get_db():
+    return get_client()[MONGO_DB_NAME]
+
+
+class LazyCollection:
+    """Module-level stand-in for a collection that resolves the client on each use."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+
+def collection(name):
+    return LazyCollection(name)
+
+
+def ping(timeout=None):
+    """Return True if the server answers a ping within timeout seconds."""
+    timeout = MONGO_PING_TIMEOUT_SECONDS if timeout is None else timeout
+    try:
+        with pymongo.timeout(timeout):
+            get_client().admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+def get_pool_stats():
+    stats = pool_stats.snapshot()
+    stats.update({
+        "pid": os.getpid(),
+        "initialized": _client is not None and _client_pid == os.getpid(),
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "server_selection_timeout_ms": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "write_concern": MONGO_WRITE_CONCERN
+    })
+    return stats
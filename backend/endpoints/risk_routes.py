@@ -1,52 +1,248 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import datetime
+import json
 import os
+import time
+import logging
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
 from werkzeug.utils import secure_filename
 from utils import (
-    extract_text_from_pdf, extract_text_from_docx, extract_text_from_txt, extract_text_from_pptx,
-    analyze_risks_with_groq, parse_risk_reports, calculate_rpn_and_suggest_fixes, standardize_severity, calculate_overall_risk, history_collection
+    iter_text, ExtractionError, buffer_upload, list_archive_documents, read_archive_member, SUPPORTED_EXTENSIONS,
+    chunk_stream, chunk_key, new_chunk_filter, analyze_chunk_stream, apply_fmea_scores, consolidate_risks, suggest_fixes, mark_suggestions_pending, standardize_severity, calculate_overall_risk, history_collection,
+    analysis_cache, GROQ_MAX_CONCURRENCY, SUGGESTIONS_ON_DEMAND
+)
+from db import get_pool_stats
+from admission import upload_admission, suggestion_admission, AdmissionRejected
+from metrics import UPLOAD_STAGE_SECONDS, PREFILTER_SKIPPED, render_metrics
+from request_context import get_request_id, submit_with_context
+from suggestions import get_risk_suggestion, SuggestionUnavailable
+from history import (
+    list_history, get_history_entry, find_latest_entry, risks_by_chunk, save_history_entry, save_history_entries,
+    HISTORY_PAGE_SIZE
+)
+from jobs import (
+    create_job, update_job, update_job_document, add_partial_results, complete_job, fail_job, get_job, get_job_updates, submit_job,
+    JOB_QUEUED, JOB_COMPLETED, JOB_FAILED
 )
 
 risk_bp = Blueprint('risk_bp', __name__)
+logger = logging.getLogger(__name__)
 
-@risk_bp.route('/api/upload', methods=['POST'])
-def upload_file():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part in the request"}), 400
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
-    if not file.filename.lower().endswith(('.pdf', '.docx', '.txt', '.ppt', '.pptx')):
-        return jsonify({"error": "Unsupported file format. Please upload a PDF, DOCX, TXT, or PPT/PPTX file."}), 400
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
+def _display_copy(item):
+    item = dict(item)
+    if "RiskSeverity" in item:
+        item["RiskSeverity"] = standardize_severity(item["RiskSeverity"])
+    return item
+
+@contextmanager
+def _stage(timings, name):
+    # Stages entered several times per upload (per-chunk parsing) accumulate
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+def _run_upload_pipeline(job_id, user_id, filename, source, temp_path):
+    timings = {}
+    started = time.perf_counter()
+    try:
+        _process_upload(job_id, timings, user_id, filename, source, temp_path)
+    finally:
+        timings["total"] = time.perf_counter() - started
+        for name, seconds in timings.items():
+            UPLOAD_STAGE_SECONDS.labels(name).observe(seconds)
+        logger.info(
+            f"Upload {job_id} finished in {timings['total']:.2f}s",
+            extra={"job_id": job_id, "file_name": filename,
+                   "stage_seconds": {name: round(seconds, 4) for name, seconds in timings.items()}}
+        )
+
+def _timed(iterable, timings, name):
+    # Lazy stages run inside the consumer's loop; time only the pulls
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+        yield item
+
+def _analyze_document(timings, user_id, filename, source, temp_path,
+                      on_stage, on_progress, on_items=None, executor=None):
+    """Extract, chunk, analyze and score one document as a stream.
+
+    Text is extracted a page/paragraph at a time into the chunker, and each
+    chunk goes to the LLM as soon as it is packed, so memory per upload is
+    bounded by the chunks in flight rather than by the document size. Risks of
+    chunks unchanged since the user's previous version of the file are carried
+    over instead of re-analyzed, and chunks the local pre-filter rejects are
+    skipped. Returns (analysis, error): the per-chunk scored items plus reuse
+    and skip bookkeeping, or a user-facing error.
+    """
     file_extension = filename.split('.')[-1].lower()
-    extracted_text = None
-    if file_extension == "pdf":
-        extracted_text = extract_text_from_pdf(file_path)
-    elif file_extension == "docx":
-        extracted_text = extract_text_from_docx(file_path)
-    elif file_extension == "txt":
-        extracted_text = extract_text_from_txt(file_path)
-    elif file_extension in ["ppt", "pptx"]:
-        extracted_text = extract_text_from_pptx(file_path)
-    os.remove(file_path)
-    if not extracted_text:
-        return jsonify({"error": "Failed to extract text from the document"}), 500
-    user_id = request.headers.get('User-ID')
-    if not user_id:
-        return jsonify({"error": "User ID is required to associate the upload with a user."}), 400
-    risk_report = analyze_risks_with_groq(extracted_text)
-    if not risk_report:
-        return jsonify({"error": "Failed to generate risk assessment report"}), 500
-    risk_items = parse_risk_reports(risk_report)
-    risk_items = calculate_rpn_and_suggest_fixes(risk_items)
+    with _stage(timings, "reuse_lookup"):
+        previous = find_latest_entry(user_id, filename)
+        previous_risks = risks_by_chunk(previous)
+    keys = []
+    # (first, last) page of each chunk; only PDF segments are pages
+    chunk_pages = [] if file_extension == "pdf" else None
+    items_by_chunk = {}
+    reused_chunks = set()
+    # Previous position of each carried-over risk -> (chunk index, position
+    # in that chunk's items) it was attached to, and the further chunks it
+    # also came from
+    carried = {}
+    also_from = {}
+    skipped = []
+    chunk_filter = new_chunk_filter()
+    # The most informative low-scoring chunk, analyzed after all if the
+    # filter would otherwise leave the document without any analysis
+    fallback = {}
+    progress = {"analyzed": 0}
+
+    def report_progress(analyzed=None):
+        # The chunk total is only known once the document is exhausted
+        if analyzed is not None:
+            progress["analyzed"] = analyzed
+        on_progress(len(reused_chunks) + len(skipped) + progress["analyzed"], len(keys))
+
+    def chunks_to_analyze(chunks):
+        for idx, chunk in enumerate(chunks):
+            if idx == 0:
+                on_stage("analyzing")
+            key = chunk_key(chunk)
+            keys.append(key)
+            with _stage(timings, "prefilter"):
+                skip = chunk_filter.check(idx, chunk) if chunk_filter else None
+            if skip:
+                skipped.append(skip)
+                PREFILTER_SKIPPED.labels(skip["reason"]).inc()
+                if skip["reason"] != "near_duplicate" and skip["score"] > fallback.get("score", -1):
+                    fallback.update(score=skip["score"], idx=idx, chunk=chunk)
+                continue
+            # A re-upload of a file the user already analyzed only sends chunks
+            # that are new or changed to the LLM; risks of unchanged chunks are
+            # carried over
+            if key in previous_risks:
+                # A merged risk is listed under each of its chunks; carry it
+                # over once, attached to the first of them
+                items = items_by_chunk[idx] = []
+                for position, item in previous_risks[key]:
+                    if position in carried:
+                        also_from.setdefault(carried[position], []).append(idx)
+                        continue
+                    carried[position] = (idx, len(items))
+                    items.append(dict(item, RiskID=f"RISK-{idx+1:03d}"))
+                reused_chunks.add(idx)
+                if on_items and items:
+                    on_items(items)
+                continue
+            yield idx, chunk
+
+    def on_report(idx, risks):
+        # Score each chunk's risks as soon as they arrive so clients can
+        # stream them; suggestions are batched once every chunk is done
+        with _stage(timings, "fmea"):
+            items = apply_fmea_scores(risks)
+        items_by_chunk[idx] = items
+        if on_items:
+            on_items([_display_copy(item) for item in items])
+
+    on_stage("extracting")
+    segments = iter_text(source, file_extension)
+    started = time.perf_counter()
+    try:
+        chunks = _timed(chunk_stream(_timed(segments, timings, "extract"), chunk_pages), timings, "chunk")
+        _, outcomes = analyze_chunk_stream(
+            chunks_to_analyze(chunks),
+            on_progress=report_progress,
+            on_report=on_report,
+            executor=executor
+        )
+    except ExtractionError:
+        # Chunks already in flight are cancelled; a truncated analysis must not be saved
+        return None, "Failed to extract text from the document"
+    finally:
+        segments.close()
+        if temp_path:
+            os.remove(temp_path)
+    if not items_by_chunk and fallback:
+        logger.info(f"{filename}: every chunk was filtered; analyzing chunk {fallback['idx']+1} anyway")
+        skipped[:] = [skip for skip in skipped if skip["chunk"] != fallback["idx"] + 1]
+        _, fallback_outcomes = analyze_chunk_stream(
+            [(fallback["idx"], fallback.pop("chunk"))], on_report=on_report, executor=executor
+        )
+        outcomes = {name: count + fallback_outcomes[name] for name, count in outcomes.items()}
+    # Extraction, chunking and filtering happen inside the analysis loop and
+    # fmea while later chunks are in flight; keep them out of the LLM stage
+    timings["chunk"] = timings.get("chunk", 0.0) - timings.get("extract", 0.0)
+    timings["analyze"] = (time.perf_counter() - started - timings["chunk"] - timings.get("extract", 0.0)
+                          - timings.get("prefilter", 0.0) - timings.get("fmea", 0.0))
+    report_progress()
+    if skipped:
+        logger.info(f"{filename}: pre-filter skipped {len(skipped)} of {len(keys)} chunks",
+                    extra={"file_name": filename, "skipped": [(skip["chunk"], skip["reason"]) for skip in skipped]})
+    if not keys:
+        return None, "Failed to extract text from the document"
+    if not items_by_chunk:
+        return None, "Failed to generate risk assessment report"
+    return {
+        "keys": keys,
+        "items_by_chunk": items_by_chunk,
+        "also_from": also_from,
+        "chunk_pages": chunk_pages,
+        "reused_chunks": reused_chunks,
+        "previous": previous,
+        "outcomes": outcomes,
+        "prefilter": {"chunks_total": len(keys), "chunks_skipped": len(skipped), "skipped": skipped}
+    }, None
+
+def _consolidate(timings, analysis):
+    """Merge near-duplicate risks across the document's chunks (see consolidate_risks)."""
+    with _stage(timings, "consolidate"):
+        analysis["risks"], analysis["chunk_risks"], analysis["merge"] = consolidate_risks(
+            analysis["items_by_chunk"], chunk_pages=analysis["chunk_pages"], also_from=analysis["also_from"])
+
+def _prepare_suggestions(analyses):
+    """Leave Immediate/Preventive suggestions pending for on-demand generation, or generate them now.
+
+    Carried-over risks keep the suggestion they already have either way.
+    """
+    risks = [risk for analysis in analyses for risk in analysis["risks"]]
+    if SUGGESTIONS_ON_DEMAND:
+        mark_suggestions_pending(risks)
+    else:
+        suggest_fixes([risk for risk in risks if "SuggestedFix" not in risk])
+
+def _history_entry(user_id, filename, analysis):
+    """Build the history entry for a consolidated document; returns (entry, summary, reuse)."""
+    reused_chunks = analysis["reused_chunks"]
+    previous = analysis["previous"]
+    risk_items = analysis["risks"]
     for item in risk_items:
         if "RiskSeverity" in item:
             item["RiskSeverity"] = standardize_severity(item["RiskSeverity"])
+    # A merged risk is listed under each of its source chunks, so a later
+    # version that keeps any of them carries the risk over
+    chunk_map = [{"key": analysis["keys"][idx], "risks": positions}
+                 for idx, positions in sorted(analysis["chunk_risks"].items())]
     overall_level, summary = calculate_overall_risk(risk_items)
-    history_entry = {
+    reuse = {
+        "previous_version": previous.get("version", 1) if previous else None,
+        "chunks_total": len(analysis["keys"]),
+        "chunks_reused": len(reused_chunks),
+        "chunks_analyzed": len(analysis["keys"]) - len(reused_chunks) - analysis["prefilter"]["chunks_skipped"],
+        # A merged risk is listed under each of its chunks; count it once
+        "risks_reused": len({position for idx in reused_chunks for position in analysis["chunk_risks"].get(idx, [])})
+    }
+    entry = {
         "user_id": user_id,
         "file_name": filename,
         "description": f"Uploaded {filename} for risk analysis.",
@@ -55,27 +251,441 @@ def upload_file():
             "level": overall_level,
             "summary": ", ".join(summary),
             "details": risk_items
-        }
+        },
+        "prefilter": analysis["prefilter"],
+        "merge": analysis["merge"],
+        "chunks": chunk_map
     }
-    history_collection.insert_one(history_entry)
-    return jsonify({"success": True, "risk_items": risk_items})
+    return entry, summary, reuse
+
+def _warn_on_parse_outcomes(job_id, filename, outcomes):
+    if outcomes["repaired"] or outcomes["error"]:
+        logger.warning(
+            f"{filename}: {outcomes['repaired']} responses repaired, {outcomes['error']} unparseable",
+            extra={"job_id": job_id, "file_name": filename, "analysis": outcomes}
+        )
+
+def _process_upload(job_id, timings, user_id, filename, source, temp_path):
+    analysis, error = _analyze_document(
+        timings, user_id, filename, source, temp_path,
+        on_stage=lambda stage: update_job(job_id, stage=stage),
+        on_progress=lambda done, total: update_job(job_id, chunks_done=done, chunks_total=total),
+        on_items=lambda items: add_partial_results(job_id, items)
+    )
+    if error:
+        fail_job(job_id, error)
+        return
+    _consolidate(timings, analysis)
+    update_job(job_id, stage="suggesting")
+    with _stage(timings, "suggestions"):
+        _prepare_suggestions([analysis])
+    history_entry, summary, reuse = _history_entry(user_id, filename, analysis)
+    update_job(job_id, stage="saving")
+    # Saving adds an ObjectId to the entry; keep the job result free of it
+    with _stage(timings, "save"):
+        entry_id = save_history_entry(dict(history_entry), analysis["previous"])
+    _warn_on_parse_outcomes(job_id, filename, analysis["outcomes"])
+    risk_summary = history_entry["risk_summary"]
+    complete_job(job_id, risk_summary["details"], risk_summary["level"], summary, reuse,
+                 analysis=analysis["outcomes"], prefilter=analysis["prefilter"], merge=analysis["merge"],
+                 entry_id=str(entry_id))
+
+# Batch uploads (/api/upload/batch): many files or ZIP archives in one request
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", 200))
+BATCH_MAX_ARCHIVE_BYTES = int(os.getenv("BATCH_MAX_ARCHIVE_BYTES", 256 * 1024 * 1024))
+# Documents extracted and chunked at once; each holds its text in memory
+# while its chunks wait for the shared LLM workers
+BATCH_DOCUMENT_WORKERS = int(os.getenv("BATCH_DOCUMENT_WORKERS", 2))
+
+def _load_buffered(source, temp_path):
+    return source, temp_path
+
+def _load_archive_member(archive, member_name):
+    return read_archive_member(archive, member_name), None
+
+def _run_batch_pipeline(job_id, user_id, documents, temp_paths):
+    started = time.perf_counter()
+    # One LLM worker pool for the whole batch keeps it within the same
+    # concurrency budget as a single upload, however many documents it holds
+    llm_executor = ThreadPoolExecutor(max_workers=GROQ_MAX_CONCURRENCY, thread_name_prefix="batch-llm")
+    try:
+        _process_batch(job_id, user_id, documents, llm_executor)
+    finally:
+        llm_executor.shutdown()
+        for path in temp_paths:
+            os.remove(path)
+        elapsed = time.perf_counter() - started
+        UPLOAD_STAGE_SECONDS.labels("batch_total").observe(elapsed)
+        logger.info(f"Batch {job_id} finished in {elapsed:.2f}s",
+                    extra={"job_id": job_id, "documents": len(documents)})
+
+def _process_batch(job_id, user_id, documents, llm_executor):
+    """Analyze batch documents as a pipeline and save them together.
+
+    documents is a list of (position, file_name, load) where load() returns
+    (source, temp_path). BATCH_DOCUMENT_WORKERS documents are extracted at a
+    time; their chunks queue on llm_executor, so one document's extraction
+    overlaps with the LLM calls of the ones before it.
+    """
+    analyses = {}
+
+    def run_document(position, filename, load):
+        timings = {}
+        error = None
+        try:
+            source, temp_path = load()
+            analysis, error = _analyze_document(
+                timings, user_id, filename, source, temp_path,
+                on_stage=lambda stage: update_job_document(job_id, position, status=stage),
+                on_progress=lambda done, total: update_job_document(
+                    job_id, position, chunks_done=done, chunks_total=total),
+                executor=llm_executor
+            )
+            if not error:
+                _consolidate(timings, analysis)
+        except Exception as e:
+            logger.exception("Batch %s: %s crashed", job_id, filename)
+            analysis, error = None, f"Unexpected error: {e}"
+        for name, seconds in timings.items():
+            UPLOAD_STAGE_SECONDS.labels(name).observe(seconds)
+        if error:
+            update_job_document(job_id, position, status="failed", error=error)
+        else:
+            analyses[position] = (filename, analysis)
+            update_job_document(job_id, position, status="analyzed")
+
+    update_job(job_id, stage="analyzing", documents_done=0, documents_total=len(documents))
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_DOCUMENT_WORKERS, len(documents)))) as executor:
+        futures = [submit_with_context(executor, run_document, *document) for document in documents]
+        for done, _ in enumerate(as_completed(futures), start=1):
+            update_job(job_id, documents_done=done)
+    if not analyses:
+        fail_job(job_id, "None of the documents in the batch could be analyzed")
+        return
+
+    # Suggestions for every document go out together so batching fills each call
+    update_job(job_id, stage="suggesting")
+    with UPLOAD_STAGE_SECONDS.labels("suggestions").time():
+        _prepare_suggestions([analysis for _, analysis in analyses.values()])
+
+    positions = sorted(analyses)
+    entries = []
+    statuses = {}
+    for position in positions:
+        filename, analysis = analyses[position]
+        entry, _, reuse = _history_entry(user_id, filename, analysis)
+        entries.append((entry, analysis["previous"]))
+        _warn_on_parse_outcomes(job_id, filename, analysis["outcomes"])
+        statuses[position] = {
+            "status": "completed",
+            "level": entry["risk_summary"]["level"],
+            "risk_count": len(entry["risk_summary"]["details"]),
+            "reuse": reuse,
+            "analysis": analysis["outcomes"],
+            "prefilter": analysis["prefilter"],
+            "merge": analysis["merge"]
+        }
+    update_job(job_id, stage="saving")
+    with UPLOAD_STAGE_SECONDS.labels("save").time():
+        entry_ids = save_history_entries(entries)
+    for position, entry_id in zip(positions, entry_ids):
+        statuses[position]["entry_id"] = str(entry_id)
+
+    job = get_job(job_id)
+    results = job.get("documents", [])
+    for position, status in statuses.items():
+        results[position].update(status)
+    levels = [status["level"] for status in statuses.values()]
+    overall_level, _ = calculate_overall_risk([{"RiskSeverity": level} for level in levels])
+    summary = [f"{result['file_name']}: {result['status']}" for result in results]
+    complete_job(job_id, [], overall_level, summary, documents=results)
+
+def _shed(rejection):
+    response = jsonify({"success": False, "error": rejection.message, "reason": rejection.reason})
+    response.headers["Retry-After"] = str(rejection.retry_after)
+    return response, rejection.status
+
+def _supported(filename):
+    return filename.lower().endswith(tuple(f".{extension}" for extension in SUPPORTED_EXTENSIONS))
+
+def _queue_upload(user_id):
+    """Validate the uploaded file and start its job; returns (response, status)."""
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part in the request"}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+    if not _supported(file.filename):
+        return jsonify({"error": "Unsupported file format. Please upload a PDF, DOCX, TXT, or PPT/PPTX file."}), 400
+    filename = secure_filename(file.filename)
+    source, temp_path = buffer_upload(file.stream)
+    queued = False
+    try:
+        job_id = create_job(user_id, filename, request_id=get_request_id())
+        logger.info(f"Queued upload {job_id}", extra={"job_id": job_id, "file_name": filename})
+        submit_job(job_id, _run_upload_pipeline, user_id, filename, source, temp_path,
+                   on_done=partial(upload_admission.release, user_id))
+        queued = True
+    finally:
+        # Once queued, the pipeline removes the spilled file when it finishes
+        if not queued and temp_path:
+            os.remove(temp_path)
+    return jsonify({"success": True, "job_id": job_id, "status": JOB_QUEUED}), 202
+
+def _queue_batch(user_id):
+    """Validate a batch of files and/or ZIP archives and start one job for it."""
+    files = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not files:
+        return jsonify({"error": "No files in the request"}), 400
+    statuses = []
+    documents = []
+    temp_paths = []
+    seen = set()
+
+    def accept(filename):
+        if not _supported(filename):
+            error = "Unsupported file format"
+        elif filename in seen:
+            # Two documents of one batch would both replace the same history entry
+            error = "Duplicate file name in batch"
+        else:
+            seen.add(filename)
+            return True
+        statuses.append({"file_name": filename, "status": "skipped", "error": error})
+        return False
+
+    def buffer(file):
+        # Spill everything to disk so a large batch is not held in memory;
+        # the files are removed once the whole batch has finished
+        source, temp_path = buffer_upload(file.stream, max_memory_bytes=0)
+        if temp_path:
+            temp_paths.append(temp_path)
+        return source
+
+    queued = False
+    try:
+        for file in files:
+            if not file.filename.lower().endswith('.zip'):
+                filename = secure_filename(file.filename)
+                if accept(filename):
+                    documents.append((len(statuses), filename, partial(_load_buffered, buffer(file), None)))
+                    statuses.append({"file_name": filename, "status": JOB_QUEUED})
+                continue
+            archive = buffer(file)
+            try:
+                members = list_archive_documents(archive)
+            except zipfile.BadZipFile:
+                return jsonify({"error": f"{file.filename} is not a valid ZIP archive"}), 400
+            if sum(size for _, size in members) > BATCH_MAX_ARCHIVE_BYTES:
+                return jsonify({"error": f"{file.filename} is too large to process"}), 413
+            for member_name, _ in members:
+                filename = secure_filename(member_name)
+                if accept(filename):
+                    documents.append((len(statuses), filename, partial(_load_archive_member, archive, member_name)))
+                    statuses.append({"file_name": filename, "status": JOB_QUEUED})
+        if not documents:
+            return jsonify({"error": "No supported documents in the batch", "documents": statuses}), 400
+        if len(documents) > BATCH_MAX_DOCUMENTS:
+            return jsonify({"error": f"A batch can contain at most {BATCH_MAX_DOCUMENTS} documents"}), 413
+        name = secure_filename(files[0].filename) if len(files) == 1 else f"{len(documents)} documents"
+        job_id = create_job(user_id, name, request_id=get_request_id(), documents=statuses)
+        logger.info(f"Queued batch {job_id} with {len(documents)} documents",
+                    extra={"job_id": job_id, "documents": len(documents), "skipped": len(statuses) - len(documents)})
+        submit_job(job_id, _run_batch_pipeline, user_id, documents, temp_paths,
+                   on_done=partial(upload_admission.release, user_id))
+        queued = True
+    finally:
+        if not queued:
+            for path in temp_paths:
+                os.remove(path)
+    return jsonify({"success": True, "job_id": job_id, "status": JOB_QUEUED, "documents": statuses}), 202
+
+def _admit_and_queue(queue):
+    user_id = request.headers.get('User-ID')
+    if not user_id:
+        return jsonify({"error": "User ID is required to associate the upload with a user."}), 400
+    # Shed load before the multipart body is parsed or buffered
+    try:
+        upload_admission.admit(user_id)
+    except AdmissionRejected as rejection:
+        logger.info(f"Upload rejected: {rejection.reason}", extra={"reason": rejection.reason})
+        return _shed(rejection)
+    queued = False
+    try:
+        response, status = queue(user_id)
+        queued = status == 202
+        return response, status
+    finally:
+        # Once queued, the job releases its slot when it finishes
+        if not queued:
+            upload_admission.release(user_id)
+
+@risk_bp.route('/api/upload', methods=['POST'])
+def upload_file():
+    return _admit_and_queue(_queue_upload)
+
+@risk_bp.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """Analyze many documents (files and/or ZIP archives) as one job.
+
+    The batch takes a single admission slot and shares one LLM concurrency
+    budget; per-document status is reported by /api/jobs/<job_id>.
+    """
+    return _admit_and_queue(_queue_batch)
+
+def _get_user_job(job_id, include_result=False):
+    user_id = request.headers.get('User-ID')
+    if not user_id:
+        return None, (jsonify({"error": "User ID is required"}), 400)
+    job = get_job(job_id, include_result=include_result)
+    if not job or job.get("user_id") != user_id:
+        return None, (jsonify({"error": "Job not found"}), 404)
+    return job, None
+
+@risk_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    job, error = _get_user_job(job_id)
+    if error:
+        return error
+    return jsonify({
+        "success": True,
+        "job_id": job["_id"],
+        "file_name": job.get("file_name", ""),
+        "status": job["status"],
+        "progress": job.get("progress", {}),
+        "documents": job.get("documents"),
+        "error": job.get("error")
+    })
+
+@risk_bp.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job, error = _get_user_job(job_id, include_result=True)
+    if error:
+        return error
+    if job["status"] == JOB_FAILED:
+        return jsonify({"success": False, "status": job["status"], "error": job.get("error")}), 500
+    if job["status"] != JOB_COMPLETED:
+        return jsonify({"success": False, "status": job["status"], "progress": job.get("progress", {})}), 202
+    return jsonify({
+        "success": True,
+        "status": job["status"],
+        "reuse": job.get("reuse"),
+        "analysis": job.get("analysis"),
+        "prefilter": job.get("prefilter"),
+        "merge": job.get("merge"),
+        "entry_id": job.get("entry_id"),
+        "documents": job.get("documents"),
+        "risk_items": job.get("risk_items", [])
+    })
+
+# Server-Sent Events settings for /api/jobs/<id>/events
+JOB_EVENTS_POLL_SECONDS = 0.5
+JOB_EVENTS_HEARTBEAT_SECONDS = 15
+# Each open stream holds a gunicorn request thread; after this long the
+# stream ends with a "reconnect" event and the client resumes from its offset
+JOB_EVENTS_MAX_SECONDS = int(os.getenv("JOB_EVENTS_MAX_SECONDS", 120))
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _job_events(job_id, sent=0):
+    last_progress = None
+    started = last_write = time.monotonic()
+    while True:
+        # A job whose worker stopped sending heartbeats comes back failed
+        # here, which ends the stream with an error event
+        job = get_job_updates(job_id, sent)
+        if not job:
+            yield _sse("error", {"error": "Job not found"})
+            return
+        for item in job.get("partial_items", []):
+            yield _sse("risk", item)
+            sent += 1
+            last_write = time.monotonic()
+        progress = job.get("progress", {})
+        if progress != last_progress:
+            yield _sse("progress", {"status": job["status"], "progress": progress})
+            last_progress = progress
+            last_write = time.monotonic()
+        if job["status"] == JOB_FAILED:
+            yield _sse("error", {"error": job.get("error")})
+            return
+        if job["status"] == JOB_COMPLETED:
+            result = get_job(job_id, include_result=True)
+            yield _sse("summary", {
+                "level": result.get("level"),
+                "summary": result.get("summary", []),
+                "reuse": result.get("reuse"),
+                "analysis": result.get("analysis"),
+                "prefilter": result.get("prefilter"),
+                "merge": result.get("merge"),
+                "entry_id": result.get("entry_id"),
+                "documents": result.get("documents"),
+                "risk_items": result.get("risk_items", [])
+            })
+            return
+        if time.monotonic() - started >= JOB_EVENTS_MAX_SECONDS:
+            yield _sse("reconnect", {"offset": sent})
+            return
+        if time.monotonic() - last_write >= JOB_EVENTS_HEARTBEAT_SECONDS:
+            # SSE comment line keeps proxies from closing an idle stream
+            yield ": keep-alive\n\n"
+            last_write = time.monotonic()
+        time.sleep(JOB_EVENTS_POLL_SECONDS)
+
+@risk_bp.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Stream a job's risks and progress; ?offset= skips risks a reconnecting client already has."""
+    job, error = _get_user_job(job_id)
+    if error:
+        return error
+    offset = max(0, request.args.get('offset', 0, type=int))
+    return Response(
+        stream_with_context(_job_events(job_id, offset)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @risk_bp.route('/api/history', methods=['GET'])
 def get_user_history():
     user_id = request.headers.get('User-ID')
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
-    history = history_collection.find({"user_id": user_id})
-    history_data = [
-        {
-            "file_name": entry.get("file_name", ""),
-            "description": entry.get("description", ""),
-            "upload_date": entry.get("upload_date", ""),
-            "risk_summary": entry.get("risk_summary", {})
-        }
-        for entry in history
-    ]
-    return jsonify({"success": True, "history": history_data})
+    try:
+        limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+        history_data, next_cursor = list_history(user_id, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+    return jsonify({"success": True, "history": history_data, "next_cursor": next_cursor})
+
+@risk_bp.route('/api/history/<entry_id>', methods=['GET'])
+def get_user_history_entry(entry_id):
+    user_id = request.headers.get('User-ID')
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    entry = get_history_entry(user_id, entry_id)
+    if not entry:
+        return jsonify({"error": "Document not found"}), 404
+    return jsonify({"success": True, "entry": entry})
+
+@risk_bp.route('/api/history/<entry_id>/risks/<int:risk_index>/suggestions', methods=['POST'])
+def generate_risk_suggestions(entry_id, risk_index):
+    """Return one stored risk with its mitigation suggestions, generating them if still pending."""
+    user_id = request.headers.get('User-ID')
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    try:
+        risk = get_risk_suggestion(user_id, entry_id, risk_index)
+    except AdmissionRejected as rejection:
+        logger.info(f"Suggestion rejected: {rejection.reason}", extra={"reason": rejection.reason})
+        return _shed(rejection)
+    except SuggestionUnavailable as e:
+        response = jsonify({"success": False, "error": str(e)})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 503
+    if risk is None:
+        return jsonify({"error": "Risk not found"}), 404
+    return jsonify({"success": True, "risk": risk})
 
 @risk_bp.route('/api/history', methods=['DELETE'])
 def delete_history_item():
@@ -89,6 +699,23 @@ def delete_history_item():
     else:
         return jsonify({"success": False, "error": "Document not found"}), 404
 
+@risk_bp.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"success": True, "llm_cache": analysis_cache.stats()})
+
+@risk_bp.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    return jsonify({"success": True, "uploads": upload_admission.stats(), "suggestions": suggestion_admission.stats()})
+
+@risk_bp.route('/api/db/stats', methods=['GET'])
+def db_stats():
+    return jsonify({"success": True, "mongo_pool": get_pool_stats()})
+
+@risk_bp.route('/api/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 @risk_bp.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "alive"})
@@ -0,0 +1,183 @@
+import base64
+import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+from utils import history_collection, SUGGESTION_PENDING, SUGGESTION_FAILED
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+# List view: everything History.js shows on a card except the risk details,
+# which can be megabytes per upload and are served by get_history_entry
+LIST_PROJECTION = {
+    "file_name": 1,
+    "description": 1,
+    "upload_date": 1,
+    "risk_summary.level": 1,
+    "risk_summary.summary": 1,
+    "risk_count": {"$size": {"$ifNull": ["$risk_summary.details", []]}}
+}
+
+def ensure_history_indexes():
+    history_collection.create_index(
+        [("user_id", ASCENDING), ("upload_date", DESCENDING), ("_id", DESCENDING)],
+        name="user_history_page"
+    )
+    history_collection.create_index(
+        [("user_id", ASCENDING), ("file_name", ASCENDING)],
+        name="user_history_file"
+    )
+
+def encode_cursor(entry):
+    raw = f"{entry['upload_date'].isoformat()}|{entry['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Return (upload_date, _id) from a cursor token, raising ValueError if malformed."""
+    try:
+        upload_date, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.datetime.fromisoformat(upload_date), ObjectId(entry_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def _serialize(entry):
+    entry = dict(entry)
+    entry["id"] = str(entry.pop("_id"))
+    entry.pop("user_id", None)
+    return entry
+
+def list_history(user_id, limit=HISTORY_PAGE_SIZE, cursor=None):
+    """Return one page of a user's uploads, newest first, and the cursor for the next page."""
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    query = {"user_id": user_id}
+    if cursor:
+        upload_date, entry_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"upload_date": {"$lt": upload_date}},
+            {"upload_date": upload_date, "_id": {"$lt": entry_id}}
+        ]
+    entries = list(history_collection.aggregate([
+        {"$match": query},
+        {"$sort": {"upload_date": DESCENDING, "_id": DESCENDING}},
+        {"$limit": limit + 1},
+        {"$project": LIST_PROJECTION}
+    ]))
+    next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return [_serialize(entry) for entry in entries[:limit]], next_cursor
+
+def get_history_entry(user_id, entry_id):
+    try:
+        entry_id = ObjectId(entry_id)
+    except (InvalidId, TypeError):
+        return None
+    entry = history_collection.find_one({"_id": entry_id, "user_id": user_id}, {"chunks": 0})
+    return _serialize(entry) if entry else None
+
+def get_history_risk(user_id, entry_id, index):
+    """Return (version, risk) for one risk of a user's entry, or None.
+
+    Only that element of risk_summary.details is read from the database.
+    """
+    try:
+        entry_id = ObjectId(entry_id)
+    except (InvalidId, TypeError):
+        return None
+    if index < 0:
+        return None
+    entries = list(history_collection.aggregate([
+        {"$match": {"_id": entry_id, "user_id": user_id}},
+        {"$project": {"_id": 0, "version": 1, "risk": {"$arrayElemAt": ["$risk_summary.details", index]}}}
+    ]))
+    if not entries or not entries[0].get("risk"):
+        return None
+    return entries[0].get("version"), entries[0]["risk"]
+
+def _unsettled_risk(user_id, entry_id, version, index):
+    # Same version of the entry, with the risk's suggestion still to be generated
+    return {"_id": ObjectId(entry_id), "user_id": user_id, "version": version,
+            f"risk_summary.details.{index}.SuggestionStatus": {"$in": [SUGGESTION_PENDING, SUGGESTION_FAILED]}}
+
+def set_risk_suggestion(user_id, entry_id, version, index, suggested_fix, recommended_actions):
+    """Store a generated suggestion on one pending or failed risk of an entry; returns True if written.
+
+    The update matches only the same version of the entry with that risk
+    still unsettled, so a re-upload that replaced the entry or an earlier
+    write of the same suggestion leaves the document untouched.
+    """
+    prefix = f"risk_summary.details.{index}"
+    result = history_collection.update_one(
+        _unsettled_risk(user_id, entry_id, version, index),
+        {"$set": {f"{prefix}.SuggestedFix": suggested_fix,
+                  f"{prefix}.FMEA.RecommendedActions": recommended_actions},
+         "$unset": {f"{prefix}.SuggestionStatus": "", f"{prefix}.SuggestionAttempts": "",
+                    f"{prefix}.SuggestionRetryAt": ""}}
+    )
+    return result.modified_count == 1
+
+def set_risk_suggestion_failed(user_id, entry_id, version, index, attempts, retry_at):
+    """Record a failed generation on one unsettled risk, not to be retried before retry_at."""
+    prefix = f"risk_summary.details.{index}"
+    result = history_collection.update_one(
+        _unsettled_risk(user_id, entry_id, version, index),
+        {"$set": {f"{prefix}.SuggestionStatus": SUGGESTION_FAILED,
+                  f"{prefix}.SuggestionAttempts": attempts,
+                  f"{prefix}.SuggestionRetryAt": retry_at}}
+    )
+    return result.modified_count == 1
+
+def find_latest_entry(user_id, file_name):
+    """Return the most recent history entry for a user's file, or None."""
+    return history_collection.find_one(
+        {"user_id": user_id, "file_name": file_name},
+        sort=[("upload_date", DESCENDING), ("_id", DESCENDING)]
+    )
+
+def risks_by_chunk(entry):
+    """Map each chunk key of a stored entry to (position, risk) pairs of the risks derived from it.
+
+    A merged risk is listed under each of its source chunks; its position in
+    the entry's details identifies it across them.
+    """
+    if not entry:
+        return {}
+    details = entry.get("risk_summary", {}).get("details", [])
+    mapping = {}
+    for chunk in entry.get("chunks", []):
+        mapping[chunk["key"]] = [(i, details[i]) for i in chunk["risks"] if i < len(details)]
+    return mapping
+
+def save_history_entry(entry, previous=None):
+    """Insert a new entry, or replace the previous version of the same file in place; returns its id.
+
+    The replacement upserts, so an entry deleted while its new version was
+    being analyzed is written again rather than silently lost.
+    """
+    if previous:
+        entry["version"] = previous.get("version", 1) + 1
+        history_collection.replace_one({"_id": previous["_id"]}, entry, upsert=True)
+        return previous["_id"]
+    entry["version"] = 1
+    return history_collection.insert_one(entry).inserted_id
+
+def save_history_entries(entries):
+    """Save a batch of (entry, previous) pairs in at most two round-trips.
+
+    New files go in with one insert_many; files that already have a history
+    entry replace it as a new version, upserting like save_history_entry.
+    Returns the entry ids in input order.
+    """
+    inserts = []
+    replacements = []
+    for entry, previous in entries:
+        if previous:
+            entry["version"] = previous.get("version", 1) + 1
+            replacements.append(ReplaceOne({"_id": previous["_id"]}, entry, upsert=True))
+        else:
+            entry["version"] = 1
+            inserts.append(entry)
+    if inserts:
+        history_collection.insert_many(inserts, ordered=False)
+    if replacements:
+        history_collection.bulk_write(replacements, ordered=False)
+    return [previous["_id"] if previous else entry["_id"] for entry, previous in entries]
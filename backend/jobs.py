@@ -0,0 +1,206 @@
+import os
+import time
+import uuid
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import jobs_collection
+from metrics import UPLOADS
+from request_context import submit_with_context
+
+logger = logging.getLogger(__name__)
+
+# Background upload processing settings
+UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", 2))
+JOB_TTL_HOURS = int(os.getenv("JOB_TTL_HOURS", 24))
+# Queued and running jobs have updated_at refreshed every JOB_HEARTBEAT_SECONDS
+# by the process that owns them; one not touched for JOB_STALE_SECONDS was
+# lost with a restarted or killed worker and is marked failed
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 300))
+JOB_STALE_ERROR = "The server processing this upload restarted. Please upload the file again."
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_JOB_WORKERS, thread_name_prefix="upload-job")
+_active_jobs = set()
+_active_lock = threading.Lock()
+_heartbeat_pid = None
+
+def ensure_job_indexes():
+    """Expire finished jobs automatically and keep per-user lookups indexed."""
+    jobs_collection.create_index("created_at", expireAfterSeconds=JOB_TTL_HOURS * 3600)
+    jobs_collection.create_index("user_id")
+
+def _ensure_heartbeat():
+    # Like the mail sender, the thread does not survive a fork; start one per process
+    global _heartbeat_pid
+    if _heartbeat_pid != os.getpid():
+        with _active_lock:
+            if _heartbeat_pid != os.getpid():
+                _heartbeat_pid = os.getpid()
+                _active_jobs.clear()
+                threading.Thread(target=_heartbeat, name="job-heartbeat", daemon=True).start()
+
+def _heartbeat():
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        with _active_lock:
+            job_ids = list(_active_jobs)
+        if not job_ids:
+            continue
+        try:
+            jobs_collection.update_many(
+                {"_id": {"$in": job_ids}, "status": {"$in": [JOB_QUEUED, JOB_RUNNING]}},
+                {"$set": {"updated_at": datetime.datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.warning(f"Job heartbeat failed: {e}")
+
+def _stale_before():
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=JOB_STALE_SECONDS)
+
+def fail_stale_jobs():
+    """Mark queued/running jobs whose owner stopped sending heartbeats as failed."""
+    result = jobs_collection.update_many(
+        {"status": {"$in": [JOB_QUEUED, JOB_RUNNING]}, "updated_at": {"$lt": _stale_before()}},
+        {"$set": {"status": JOB_FAILED, "error": JOB_STALE_ERROR, "updated_at": datetime.datetime.utcnow()}}
+    )
+    if result.modified_count:
+        UPLOADS.labels("abandoned").inc(result.modified_count)
+        logger.warning(f"Marked {result.modified_count} abandoned upload jobs as failed")
+    return result.modified_count
+
+def _fail_if_stale(job):
+    # Catches jobs orphaned since startup; the conditional update loses to
+    # any write the owning worker makes in the meantime
+    if not job or job["status"] not in (JOB_QUEUED, JOB_RUNNING) or job["updated_at"] >= _stale_before():
+        return job
+    result = jobs_collection.update_one(
+        {"_id": job["_id"], "status": job["status"], "updated_at": job["updated_at"]},
+        {"$set": {"status": JOB_FAILED, "error": JOB_STALE_ERROR, "updated_at": datetime.datetime.utcnow()}}
+    )
+    if result.modified_count:
+        UPLOADS.labels("abandoned").inc()
+        logger.warning(f"Upload job {job['_id']} was abandoned", extra={"job_id": job["_id"]})
+        job.update(status=JOB_FAILED, error=JOB_STALE_ERROR)
+    return job
+
+def create_job(user_id, file_name, request_id=None, documents=None):
+    """Create a queued job; batch jobs pass one status dict per document."""
+    job_id = str(uuid.uuid4())
+    now = datetime.datetime.utcnow()
+    job = {
+        "_id": job_id,
+        "user_id": user_id,
+        "file_name": file_name,
+        "request_id": request_id,
+        "status": JOB_QUEUED,
+        "progress": {"stage": "queued", "chunks_done": 0, "chunks_total": 0},
+        "created_at": now,
+        "updated_at": now
+    }
+    if documents is not None:
+        job["documents"] = documents
+    jobs_collection.insert_one(job)
+    return job_id
+
+def update_job(job_id, status=None, **progress):
+    fields = {"updated_at": datetime.datetime.utcnow()}
+    if status:
+        fields["status"] = status
+    for key, value in progress.items():
+        fields[f"progress.{key}"] = value
+    jobs_collection.update_one({"_id": job_id}, {"$set": fields})
+
+def update_job_document(job_id, position, **fields):
+    """Update the status entry of one document of a batch job."""
+    update = {"updated_at": datetime.datetime.utcnow()}
+    for key, value in fields.items():
+        update[f"documents.{position}.{key}"] = value
+    jobs_collection.update_one({"_id": job_id}, {"$set": update})
+
+def add_partial_results(job_id, risk_items, **progress):
+    """Append risk items scored so far; streamed to clients before the job completes."""
+    fields = {"updated_at": datetime.datetime.utcnow()}
+    for key, value in progress.items():
+        fields[f"progress.{key}"] = value
+    jobs_collection.update_one({"_id": job_id}, {
+        "$push": {"partial_items": {"$each": risk_items}},
+        "$set": fields
+    })
+
+def complete_job(job_id, risk_items, level=None, summary=None, reuse=None, analysis=None, documents=None,
+                 prefilter=None, merge=None, entry_id=None):
+    UPLOADS.labels("completed").inc()
+    fields = {
+        "status": JOB_COMPLETED,
+        "progress.stage": "done",
+        "risk_items": risk_items,
+        "level": level,
+        "summary": summary,
+        "reuse": reuse,
+        "analysis": analysis,
+        "prefilter": prefilter,
+        "merge": merge,
+        "entry_id": entry_id,
+        "updated_at": datetime.datetime.utcnow()
+    }
+    if documents is not None:
+        fields["documents"] = documents
+    jobs_collection.update_one({"_id": job_id}, {"$set": fields})
+
+def fail_job(job_id, error):
+    UPLOADS.labels("failed").inc()
+    logger.warning(f"Upload job {job_id} failed: {error}", extra={"job_id": job_id})
+    jobs_collection.update_one({"_id": job_id}, {"$set": {
+        "status": JOB_FAILED,
+        "error": error,
+        "updated_at": datetime.datetime.utcnow()
+    }})
+
+def get_job(job_id, include_result=False):
+    projection = {"partial_items": 0} if include_result else {"risk_items": 0, "partial_items": 0}
+    return _fail_if_stale(jobs_collection.find_one({"_id": job_id}, projection))
+
+def get_job_updates(job_id, partial_offset):
+    """Fetch job status plus only the partial items not yet sent to a streaming client."""
+    return _fail_if_stale(jobs_collection.find_one(
+        {"_id": job_id},
+        {"risk_items": 0, "partial_items": {"$slice": [partial_offset, 1000000]}}
+    ))
+
+def submit_job(job_id, func, *args, on_done=None):
+    """Run func(job_id, *args) on the background pool, recording any crash on the job.
+
+    The job runs with the submitting request's context, so its logs carry the
+    same request id. on_done() is called once the job has finished either way.
+    While queued or running the job is kept alive by this process's heartbeat.
+    """
+    _ensure_heartbeat()
+    with _active_lock:
+        _active_jobs.add(job_id)
+
+    def run():
+        try:
+            update_job(job_id, status=JOB_RUNNING, stage="starting")
+            func(job_id, *args)
+        except Exception as e:
+            logger.exception("Upload job %s crashed", job_id)
+            fail_job(job_id, f"Unexpected error: {e}")
+        finally:
+            with _active_lock:
+                _active_jobs.discard(job_id)
+            if on_done:
+                on_done()
+    try:
+        submit_with_context(_executor, run)
+    except BaseException:
+        # Never scheduled: stop heartbeating it so it goes stale like any lost job
+        with _active_lock:
+            _active_jobs.discard(job_id)
+        raise
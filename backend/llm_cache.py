@@ -0,0 +1,84 @@
+import re
+import json
+import hashlib
+import logging
+import threading
+import datetime
+from cache_utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_chunk(text):
+    """Collapse whitespace so re-extracted copies of the same text hash equally."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(chunk, model, prompt_version, temperature):
+    material = json.dumps(
+        [normalize_chunk(chunk), model, prompt_version, float(temperature)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class RiskAnalysisCache:
+    """Two-tier cache of validated per-chunk risk analysis responses.
+
+    Lookups hit the in-process LRU first and fall back to a Mongo collection
+    whose documents expire through a TTL index. Mongo errors are logged and
+    treated as misses so the cache can never fail an upload.
+    """
+
+    def __init__(self, collection, max_entries=1024, ttl_days=30):
+        self.collection = collection
+        self.ttl_days = ttl_days
+        self.memory = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def ensure_indexes(self):
+        self.collection.create_index("created_at", expireAfterSeconds=self.ttl_days * 86400)
+
+    def get(self, key):
+        content = self.memory.get(key)
+        if content is not None:
+            self._count("memory_hits")
+            return content
+        try:
+            doc = self.collection.find_one({"_id": key}, {"content": 1})
+        except Exception as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            self._count("errors")
+            doc = None
+        if doc:
+            self._count("mongo_hits")
+            self.memory.set(key, doc["content"])
+            return doc["content"]
+        self._count("misses")
+        return None
+
+    def set(self, key, content):
+        self.memory.set(key, content)
+        try:
+            self.collection.update_one(
+                {"_id": key},
+                {"$set": {"content": content, "created_at": datetime.datetime.utcnow()}},
+                upsert=True
+            )
+            self._count("writes")
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+            self._count("errors")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["memory_hits"] + stats["mongo_hits"] + stats["misses"]
+        stats["memory_entries"] = len(self.memory)
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
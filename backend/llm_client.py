@@ -0,0 +1,131 @@
+import os
+import time
+import logging
+import threading
+from rate_limiter import TokenBucketLimiter, estimate_tokens
+from metrics import (
+    LLM_REQUEST_SECONDS, LLM_CALLS, LLM_RETRIES, LLM_BACKOFF_SECONDS, LLM_RATE_LIMIT_WAIT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Any OpenAI-compatible chat completions server works, e.g. a local stub for load tests
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 10))
+
+# Groq quota shared by every LLM call made from this process
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", 30))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", 12000))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when a chat completion could not be obtained."""
+
+
+class LLMClient:
+    """Chat completions client with a pooled keep-alive session, timeouts and retries."""
+
+    def __init__(self, api_key, base_url=LLM_BASE_URL, model=LLM_MODEL,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, pool_size=LLM_POOL_SIZE, limiter=None):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(1, max_retries)
+        self.limiter = limiter
+        # requests is imported here rather than at module level so worker boot
+        # does not pay for it until the first LLM call
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def chat(self, prompt, max_tokens, temperature=0.4, json_mode=False, purpose="chat"):
+        """Send a single-message chat completion and return the reply text.
+
+        429, 5xx, connection errors and timeouts are retried with exponential
+        backoff (honouring Retry-After); other client errors fail immediately.
+        purpose only labels the call's metrics.
+        """
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        import requests
+        delay = 2
+        last_error = None
+        for attempt in range(self.max_retries):
+            if self.limiter:
+                with LLM_RATE_LIMIT_WAIT_SECONDS.labels(purpose).time():
+                    self.limiter.acquire(estimate_tokens(prompt) + max_tokens)
+            started = time.perf_counter()
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last_error = e
+                reason = "timeout" if isinstance(e, requests.exceptions.Timeout) else "connection_error"
+                LLM_REQUEST_SECONDS.labels(purpose, reason).observe(time.perf_counter() - started)
+            else:
+                reason = str(response.status_code)
+                LLM_REQUEST_SECONDS.labels(purpose, reason).observe(time.perf_counter() - started)
+                if response.status_code not in RETRYABLE_STATUS:
+                    try:
+                        response.raise_for_status()
+                        content = response.json()["choices"][0]["message"]["content"]
+                    except (requests.exceptions.HTTPError, ValueError, KeyError, IndexError) as e:
+                        LLM_CALLS.labels(purpose, "error").inc()
+                        raise LLMError(f"LLM request failed: {e}") from e
+                    LLM_CALLS.labels(purpose, "ok").inc()
+                    return content
+                last_error = LLMError(f"LLM returned HTTP {response.status_code}")
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.replace(".", "", 1).isdigit():
+                    delay = max(delay, float(retry_after))
+                if response.status_code == 429 and self.limiter:
+                    self.limiter.penalize(delay)
+            if attempt + 1 < self.max_retries:
+                logger.warning(
+                    f"LLM call failed ({last_error}); retrying in {delay}s",
+                    extra={"purpose": purpose, "attempt": attempt + 1, "reason": reason}
+                )
+                LLM_RETRIES.labels(purpose, reason).inc()
+                LLM_BACKOFF_SECONDS.labels(purpose).inc(delay)
+                time.sleep(delay)
+                delay *= 2
+        LLM_CALLS.labels(purpose, "error").inc()
+        raise LLMError(f"LLM request failed after {self.max_retries} attempts: {last_error}")
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Return the LLM client for this process, building a fresh one after fork."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = LLMClient(
+                    os.getenv("GROQ_API_KEY"),
+                    limiter=TokenBucketLimiter(GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE)
+                )
+                _client_pid = pid
+    return _client
@@ -0,0 +1,146 @@
+import os
+import time
+import queue
+import smtplib
+import logging
+import threading
+from metrics import MAIL_MESSAGES, MAIL_SEND_SECONDS
+from request_context import get_request_id, set_request_id, request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Outgoing mail server; point at a local stand-in (e.g. `python -m aiosmtpd -n -l
+# localhost:8025` with SMTP_USE_SSL=false) to test without sending real mail
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 465))
+SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))
+# Servers drop idle sessions; close ours first and reconnect on the next message
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", 60))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", 3))
+MAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("MAIL_RETRY_BACKOFF_SECONDS", 2))
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", 1000))
+
+# Failures that retrying the same message cannot fix
+_PERMANENT_ERRORS = (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+
+class MailSender:
+    """Queue of outgoing messages drained by one background thread.
+
+    The thread keeps a single authenticated SMTP session open between
+    messages, so callers only pay for putting a message on the queue.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_USE_SSL, starttls=SMTP_STARTTLS,
+                 timeout=SMTP_TIMEOUT, max_retries=MAIL_MAX_RETRIES, queue_size=MAIL_QUEUE_SIZE):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._connection = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # The sender thread does not survive a fork; start one per process
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._connection = None
+                    self._thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+                    self._pid = os.getpid()
+                    self._thread.start()
+
+    def enqueue(self, sender, recipients, message):
+        """Queue a message for delivery; returns False if the queue is full."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((get_request_id(), sender, list(recipients), message))
+            return True
+        except queue.Full:
+            MAIL_MESSAGES.labels("dropped").inc()
+            logger.error("Mail queue is full; dropping message", extra={"recipients": list(recipients)})
+            return False
+
+    def _connect(self):
+        if self.use_ssl:
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                connection.starttls()
+        user, password = os.getenv("EMAIL_USER"), os.getenv("EMAIL_PASS")
+        if user and password:
+            connection.login(user, password)
+        return connection
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._connection = None
+
+    def _deliver(self, sender, recipients, message):
+        delay = MAIL_RETRY_BACKOFF_SECONDS
+        attempt = 0
+        while True:
+            reused = self._connection is not None
+            try:
+                if self._connection is None:
+                    self._connection = self._connect()
+                with MAIL_SEND_SECONDS.time():
+                    self._connection.sendmail(sender, recipients, message)
+                return True
+            except _PERMANENT_ERRORS as e:
+                logger.error(f"Mail to {recipients} rejected: {e}")
+                self._close()
+                return False
+            except (smtplib.SMTPException, OSError) as e:
+                self._close()
+                if reused and isinstance(e, smtplib.SMTPServerDisconnected):
+                    # The kept-alive session went stale; the next try opens a
+                    # fresh one, so this does not count as a failed attempt
+                    logger.info("SMTP session closed by server; reconnecting")
+                    continue
+                attempt += 1
+                if attempt >= self.max_retries:
+                    logger.error(f"Mail delivery to {recipients} failed after {attempt} attempts: {e}")
+                    return False
+                logger.warning(f"Mail delivery failed ({e}); retrying in {delay}s")
+                time.sleep(delay)
+                delay *= 2
+
+    def _run(self):
+        while True:
+            try:
+                request_id, sender, recipients, message = self._queue.get(timeout=SMTP_IDLE_SECONDS)
+            except queue.Empty:
+                self._close()
+                continue
+            # Log delivery under the id of the request that queued the message
+            token = set_request_id(request_id)
+            try:
+                delivered = self._deliver(sender, recipients, message)
+                MAIL_MESSAGES.labels("sent" if delivered else "failed").inc()
+            except Exception:
+                MAIL_MESSAGES.labels("failed").inc()
+                logger.exception("Unexpected error in mail sender")
+                self._close()
+            finally:
+                request_id_var.reset(token)
+                self._queue.task_done()
+
+    def join(self):
+        """Block until every queued message has been handled (e.g. before shutdown)."""
+        self._queue.join()
+
+
+mail_sender = MailSender()
@@ -0,0 +1,75 @@
+import os
+from prometheus_client import (
+    Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+)
+
+# Stage latencies range from milliseconds (parsing) to minutes (whole uploads)
+STAGE_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+UPLOAD_STAGE_SECONDS = Histogram(
+    "upload_stage_seconds", "Time spent in each stage of the upload pipeline",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+UPLOADS = Counter("uploads_total", "Finished upload jobs by outcome", ["outcome"])
+UPLOADS_IN_FLIGHT = Gauge(
+    "uploads_in_flight", "Uploads admitted and not yet finished", multiprocess_mode="livesum"
+)
+ADMISSION_REJECTIONS = Counter("admission_rejections_total", "Uploads shed by admission control", ["reason"])
+SUGGESTIONS_IN_FLIGHT = Gauge(
+    "suggestions_in_flight", "On-demand suggestion LLM calls admitted and not yet finished", multiprocess_mode="livesum"
+)
+SUGGESTION_REJECTIONS = Counter(
+    "suggestion_rejections_total", "On-demand suggestion calls shed by admission control", ["reason"]
+)
+EXTRACTION_SECONDS = Histogram(
+    "extraction_seconds", "Text extraction time by file format", ["format"], buckets=STAGE_BUCKETS
+)
+EXTRACTION_FAILURES = Counter("extraction_failures_total", "Documents no text could be extracted from", ["format"])
+
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "Duration of each HTTP attempt to the LLM API",
+    ["purpose", "status"], buckets=STAGE_BUCKETS
+)
+LLM_CALLS = Counter("llm_calls_total", "Chat completions by final outcome", ["purpose", "outcome"])
+LLM_RETRIES = Counter("llm_retries_total", "LLM attempts that were retried, by cause", ["purpose", "reason"])
+LLM_BACKOFF_SECONDS = Counter("llm_backoff_seconds_total", "Time slept between LLM retries", ["purpose"])
+LLM_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "llm_rate_limit_wait_seconds", "Time a call waited on the shared Groq quota limiter",
+    ["purpose"], buckets=STAGE_BUCKETS
+)
+
+PREFILTER_SKIPPED = Counter(
+    "prefilter_skipped_chunks_total", "Chunks not sent to the LLM by the local pre-filter", ["reason"]
+)
+PARSE_FALLBACKS = Counter(
+    "risk_parse_fallbacks_total", "Risk reports that needed a repair path to parse", ["kind"]
+)
+SUGGESTION_REQUESTS = Counter(
+    "suggestion_requests_total", "On-demand suggestion requests by how they were served or refused", ["outcome"]
+)
+
+MAIL_MESSAGES = Counter("mail_messages_total", "Outgoing mail by delivery outcome", ["outcome"])
+MAIL_SEND_SECONDS = Histogram(
+    "mail_send_seconds", "SMTP send time per message on an open session", buckets=DB_BUCKETS
+)
+
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_seconds", "MongoDB command duration by command name", ["command"], buckets=DB_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter("mongo_command_failures_total", "Failed MongoDB commands", ["command"])
+
+
+def render_metrics():
+    """Return (body, content_type) in the Prometheus text format.
+
+    With PROMETHEUS_MULTIPROC_DIR set (several gunicorn workers), samples from
+    every worker are aggregated; otherwise this process's registry is used.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
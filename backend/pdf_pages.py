@@ -0,0 +1,19 @@
+# PDF page extraction used by utils.iter_pdf_pages. Page-range workers run in
+# forkserver/spawn processes that import this module by name, so it must stay
+# free of the app's Mongo, LLM and metrics setup.
+
+
+def open_pdf(source):
+    import fitz  # PyMuPDF is heavy; only load it once a PDF actually arrives
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def extract_page_range(path, start, stop):
+    # Runs in a worker process: each worker opens its own copy of the document
+    doc = open_pdf(path)
+    try:
+        return [doc[page_number].get_text("text") for page_number in range(start, stop)]
+    finally:
+        doc.close()
@@ -0,0 +1,161 @@
+import re
+import zlib
+
+# Words that make up most of any English prose; a section made almost
+# entirely of other tokens is a table, index or reference list
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers him his how i if in into is it its itself just may me might more most must my no nor not
+now of off on once only or other our ours out over own same shall she should so some such than that the
+their them then there these they this those through to too under until up upon very was we were what when
+where which while who whom why will with within without would you your
+""".split())
+
+# Vocabulary that tends to carry risk content (obligations, threats, controls, impacts)
+RISK_KEYWORDS = frozenset("""
+access account accountability attack audit authentication authorization availability backup breach budget
+compliance confidential confidentiality contract control controls cost credential critical cyber damage data
+deadline delay dependency disaster disclosure downtime encrypt encrypted encryption exposure failure fine
+fines fraud gdpr hazard hipaa impact incident incidents injury insurance integrity legal liability loss
+malware monitoring must negligence obligation obligations outage outsourcing password patch penalty personal
+phishing privacy prohibited protect protection ransomware recovery regulation regulatory requirement
+requirements resilience retention risk risks safety security sensitive shall supplier third threat threats
+unauthorized vendor violation vulnerability vulnerabilities warranty
+""".split())
+
+# Lines typical of tables of contents, signature blocks and reference lists
+_BOILERPLATE_LINE = re.compile(
+    r"(\.{4,}|…{2,}|_{2,}|-{4,})\s*\d*\s*$"                       # dot leaders, blanks to sign on
+    r"|^\s*\d+(\.\d+)*\.?\s+[^.!?]{1,80}?\s+\d{1,4}\s*$"              # "3.2 Scope 14"
+    r"|^\s*\d{1,4}\s*$"                                                # page numbers split off entries
+    r"|^\s*(signature|signed|name|title|date|witness|approved by|prepared by)\s*[:_]"
+    r"|^\s*\[\d+\]|doi:|https?://|\bisbn\b|\bet al\.",
+    re.IGNORECASE
+)
+# Words of two or more letters in any script, with inner apostrophes/hyphens
+_WORD = re.compile(r"[^\W\d_](?:[^\W\d_]|['-](?=[^\W\d_]))+")
+
+# The word lists are English: a document whose words are almost never
+# English stopwords is in another language, and informativeness() cannot
+# judge it, so only the length and duplicate checks apply
+MIN_STOPWORD_COVERAGE = 0.05
+
+# MinHash: signature length, words per shingle and the LSH band layout used to
+# find candidate duplicates (NUM_PERM must equal BANDS * ROWS)
+NUM_PERM = 64
+SHINGLE_WORDS = 5
+LSH_BANDS = 16
+LSH_ROWS = 4
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def informativeness(chunk, min_words):
+    """Score how likely a chunk is to carry risk content, from 0 to 1.
+
+    Combines length (relative to min_words), the stopword ratio of natural
+    prose, the density of risk vocabulary and the share of lines that look
+    like a table of contents, signature block or reference list. Returns
+    (score, signals).
+    """
+    words = _WORD.findall(chunk.lower())
+    lines = [line for line in chunk.splitlines() if line.strip()]
+    if not words:
+        return 0.0, {"words": 0}
+    stopword_ratio = sum(word in STOPWORDS for word in words) / len(words)
+    keyword_density = sum(word in RISK_KEYWORDS for word in words) / len(words)
+    boilerplate_ratio = sum(bool(_BOILERPLATE_LINE.search(line)) for line in lines) / max(1, len(lines))
+    length_score = min(1.0, len(words) / (3 * min_words))
+    # Prose runs at 35-55% stopwords; risk-bearing text at 1%+ keywords
+    prose_score = min(1.0, stopword_ratio / 0.35)
+    keyword_score = min(1.0, keyword_density / 0.01)
+    score = (0.25 * length_score + 0.25 * prose_score + 0.5 * keyword_score) * (1 - boilerplate_ratio)
+    return round(score, 3), {
+        "words": len(words),
+        "stopword_ratio": round(stopword_ratio, 3),
+        "keyword_density": round(keyword_density, 4),
+        "boilerplate_lines": round(boilerplate_ratio, 3)
+    }
+
+
+class MinHasher:
+    """MinHash signatures over word shingles; equal slots estimate Jaccard similarity."""
+
+    def __init__(self, num_perm=NUM_PERM, shingle_words=SHINGLE_WORDS, seed=1):
+        import numpy as np  # deferred like scoring.py; only needed once uploads arrive
+        rng = np.random.RandomState(seed)
+        self.shingle_words = shingle_words
+        self._a = rng.randint(1, 1 << 31, num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, num_perm).astype(np.uint64)
+
+    def signature(self, text):
+        import numpy as np
+        words = _WORD.findall(text.lower())
+        k = self.shingle_words
+        shingles = {" ".join(words[i:i + k]) for i in range(max(1, len(words) - k + 1))}
+        # crc32 < 2**32 and a < 2**31, so a * h + b cannot overflow uint64
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME).min(axis=0)
+
+
+class ChunkFilter:
+    """Decides, chunk by chunk, which chunks are worth an LLM call.
+
+    A chunk is skipped when it is shorter than min_words, scores below
+    min_score on informativeness(), or is a near-duplicate (estimated Jaccard
+    similarity of at least duplicate_threshold) of a chunk already kept.
+    Kept chunks are indexed with LSH so each check compares against a handful
+    of candidates rather than every earlier chunk. The informativeness test is
+    skipped while the document's stopword coverage so far is below
+    MIN_STOPWORD_COVERAGE. One filter per document.
+    """
+
+    def __init__(self, min_score=0.3, min_words=25, duplicate_threshold=0.85):
+        self.min_score = min_score
+        self.min_words = min_words
+        self.duplicate_threshold = duplicate_threshold
+        self._hasher = MinHasher() if duplicate_threshold < 1 else None
+        self._signatures = {}
+        self._buckets = {}
+        self._words = 0
+        self._stopwords = 0
+
+    def _find_duplicate(self, signature):
+        best, best_similarity = None, 0.0
+        candidates = set()
+        for band in range(LSH_BANDS):
+            key = (band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes())
+            candidates.update(self._buckets.get(key, ()))
+        for idx in candidates:
+            similarity = float((self._signatures[idx] == signature).mean())
+            if similarity > best_similarity:
+                best, best_similarity = idx, similarity
+        if best is not None and best_similarity >= self.duplicate_threshold:
+            return best, best_similarity
+        return None, best_similarity
+
+    def _remember(self, idx, signature):
+        self._signatures[idx] = signature
+        for band in range(LSH_BANDS):
+            key = (band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes())
+            self._buckets.setdefault(key, []).append(idx)
+
+    def check(self, idx, chunk):
+        """Return None to analyze chunk idx, or a dict saying why it is skipped."""
+        score, signals = informativeness(chunk, self.min_words)
+        if signals["words"] < self.min_words:
+            return {"chunk": idx + 1, "reason": "too_short", "score": score, "signals": signals}
+        self._words += signals["words"]
+        self._stopwords += round(signals["stopword_ratio"] * signals["words"])
+        english = self._stopwords >= MIN_STOPWORD_COVERAGE * self._words
+        if english and score < self.min_score:
+            return {"chunk": idx + 1, "reason": "low_information", "score": score, "signals": signals}
+        if self._hasher is None:
+            return None
+        signature = self._hasher.signature(chunk)
+        duplicate_of, similarity = self._find_duplicate(signature)
+        if duplicate_of is not None:
+            return {"chunk": idx + 1, "reason": "near_duplicate", "duplicate_of": duplicate_of + 1,
+                    "similarity": round(similarity, 3)}
+        self._remember(idx, signature)
+        return None
@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class TokenBucketLimiter:
+    """Thread-safe limiter enforcing requests/min and tokens/min budgets.
+
+    Both budgets are modelled as token buckets that refill continuously, so
+    short bursts up to the per-minute capacity are allowed while the long-run
+    rate stays under the provider quota.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = max(1, int(requests_per_minute))
+        self.tokens_per_minute = max(1, int(tokens_per_minute))
+        self._request_allowance = float(self.requests_per_minute)
+        self._token_allowance = float(self.tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_allowance = min(
+            self.requests_per_minute,
+            self._request_allowance + elapsed * self.requests_per_minute / 60.0
+        )
+        self._token_allowance = min(
+            self.tokens_per_minute,
+            self._token_allowance + elapsed * self.tokens_per_minute / 60.0
+        )
+
+    def acquire(self, tokens=0):
+        """Block until one request carrying `tokens` tokens may be sent."""
+        # A single request larger than the whole bucket could never be
+        # admitted, so cap it at the bucket capacity.
+        tokens = min(max(0, int(tokens)), self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                    self._request_allowance -= 1
+                    self._token_allowance -= tokens
+                    return
+                request_wait = (1 - self._request_allowance) * 60.0 / self.requests_per_minute
+                token_wait = (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute
+                wait = max(request_wait, token_wait, 0.01)
+            time.sleep(wait)
+
+    def try_acquire(self, tokens=0):
+        """Take one request without blocking.
+
+        Returns 0 if it was admitted, otherwise the seconds until it would be.
+        """
+        tokens = min(max(0, int(tokens)), self.tokens_per_minute)
+        with self._lock:
+            self._refill()
+            if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                self._request_allowance -= 1
+                self._token_allowance -= tokens
+                return 0
+            request_wait = (1 - self._request_allowance) * 60.0 / self.requests_per_minute
+            token_wait = (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute
+            return max(request_wait, token_wait, 0.01)
+
+    def penalize(self, seconds):
+        """Drain the request bucket after the provider answered 429.
+
+        Every thread sharing the limiter then backs off together instead of
+        each one hammering the API with its own retry.
+        """
+        with self._lock:
+            self._refill()
+            self._request_allowance -= seconds * self.requests_per_minute / 60.0
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)."""
+    return len(text) // 4 + 1
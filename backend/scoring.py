@@ -0,0 +1,174 @@
+import re
+
+# FMEA thresholds
+RPN_HIGH = 200
+RPN_MODERATE = 100
+CN_HIGH = 70  # Severity (1-10) × Occurrence threshold
+
+SEVERITY_SCORES = {
+    "critical": 10, "red": 10,
+    "high": 8, "orange": 8,
+    "medium": 6, "med": 6, "yellow": 6,
+    "low": 3, "green": 3
+}
+OCCURRENCE_SCORES = {
+    "high": 10, "very high": 10, "certain": 10,
+    "medium": 6, "moderate": 6, "likely": 6,
+    "low": 3, "unlikely": 3, "rare": 3
+}
+STANDARD_SEVERITY_COLORS = {"red": "Critical", "orange": "High", "yellow": "Medium", "green": "Low"}
+
+DETECTION_TERMS = ["monitor", "alert", "logging", "audit", "detect", "scan", "dashboard", "tracking"]
+CONTROL_INDICATORS = [
+    "currently", "existing", "in place", "implemented",
+    "already", "present", "established"
+]
+
+# A single alternation finds whether a field mentions any control indicator at
+# all; only fields that do are split into sentences. Detection terms are few
+# enough that CPython's substring search beats a regex scan, and it keeps
+# overlapping matches ("dashboardetect") counted exactly as before.
+_DETECTION_TERMS = tuple(DETECTION_TERMS)
+_CONTROL_PATTERN = re.compile("|".join(map(re.escape, CONTROL_INDICATORS)))
+
+ACTION_LEVELS = ("Immediate", "Preventive", "ManualReview", "Monitor")
+
+
+def severity_score(severity):
+    if not severity or severity == "Unknown":
+        return 5
+    return SEVERITY_SCORES.get(str(severity).strip().lower(), 5)
+
+
+def occurrence_score(probability):
+    if not probability or probability == "Unknown":
+        return 5
+    return OCCURRENCE_SCORES.get(str(probability).strip().lower(), 5)
+
+
+def standard_severity(severity):
+    if not severity:
+        return "Unknown"
+    severity = severity.lower()
+    if severity in STANDARD_SEVERITY_COLORS:
+        return STANDARD_SEVERITY_COLORS[severity]
+    if "critical" in severity:
+        return "Critical"
+    elif "high" in severity:
+        return "High"
+    elif "medium" in severity or "med" in severity:
+        return "Medium"
+    elif "low" in severity:
+        return "Low"
+    return "Unknown"
+
+
+def _category_base_score(category):
+    if "security" in category:
+        return 7
+    elif "technical" in category:
+        return 6
+    elif "operational" in category:
+        return 5
+    elif "compliance" in category or "legal" in category:
+        return 4
+    return 5
+
+
+def detectability_score(risk):
+    category = str(risk.get("RiskCategory", "")).strip().lower()
+    description = str(risk.get("RiskDescription", "")).lower()
+    technical_mitigation = str(risk.get("TechnicalMitigation", "")).lower()
+    control_count = 0
+    for term in _DETECTION_TERMS:
+        if term in description or term in technical_mitigation:
+            control_count += 1
+    detection_adjustment = min(control_count, 4)
+    return max(1, min(10, _category_base_score(category) - detection_adjustment))
+
+
+def current_controls(risk):
+    controls = []
+    for field in ("RiskDescription", "TechnicalMitigation", "NonTechnicalMitigation"):
+        text = risk.get(field, "")
+        sentences = text.split(". ")
+        # No indicator contains ". ", so a field without a match anywhere has
+        # no matching sentence either
+        if not _CONTROL_PATTERN.search(text.lower()):
+            continue
+        for sentence in sentences:
+            if _CONTROL_PATTERN.search(sentence.lower()):
+                controls.append(sentence.strip())
+    if not controls:
+        return "No existing controls documented."
+    return " ".join(controls)
+
+
+def score_batch(severity, occurrence, detection):
+    """Compute RPN, CN and action levels for whole arrays of S/O/D scores."""
+    import numpy as np  # deferred so importing the app stays cheap
+    severity = np.asarray(severity, dtype=np.int64)
+    occurrence = np.asarray(occurrence, dtype=np.int64)
+    detection = np.asarray(detection, dtype=np.int64)
+    cn = severity * occurrence
+    rpn = cn * detection
+    level_index = np.select(
+        [
+            (rpn >= RPN_HIGH) | (cn >= CN_HIGH) | (severity >= 9),
+            (rpn >= RPN_MODERATE) | (cn >= (CN_HIGH // 2)),
+            severity >= 8
+        ],
+        [0, 1, 2],
+        default=3
+    )
+    return rpn, cn, np.array(ACTION_LEVELS)[level_index]
+
+
+def apply_fmea_scores(risk_items):
+    """Attach FMEA fields to every risk, scoring the whole batch at once.
+
+    Risks whose fields cannot be scored get RPN 0 and an error SuggestedFix.
+    Suggestions for Immediate/Preventive risks are left to the caller.
+    """
+    scored = []
+    severities, occurrences, detections, controls = [], [], [], []
+    for risk in risk_items:
+        try:
+            severity = severity_score(risk.get("RiskSeverity", "Low"))
+            occurrence = occurrence_score(risk.get("Probability", "Low"))
+            detection = detectability_score(risk)
+            control = current_controls(risk)
+        except Exception as e:
+            risk["RPN"] = 0
+            risk["SuggestedFix"] = f"Error calculating RPN: {e}"
+            continue
+        scored.append(risk)
+        severities.append(severity)
+        occurrences.append(occurrence)
+        detections.append(detection)
+        controls.append(control)
+    rpn, cn, action_levels = score_batch(severities, occurrences, detections)
+    for risk, s, o, d, r, level, control in zip(
+        scored, severities, occurrences, detections, rpn.tolist(), action_levels.tolist(), controls
+    ):
+        risk["FMEA"] = {
+            "Severity": s,
+            "Occurrence": o,
+            "Detection": d,
+            "RPN": r,
+            "CurrentControls": control,
+            "RecommendedActions": [],
+            "ActionStatus": "Not Started",
+            "ResponsiblePerson": "",
+            "TargetDate": "",
+            "ActionTaken": "",
+            "UpdatedRPN": None,
+            "ActionLevel": level
+        }
+        risk["RPN"] = r
+        risk["ActionLevel"] = level
+        if level == "ManualReview":
+            risk["SuggestedFix"] = "Manual review required by risk team."
+        elif level not in ["Immediate", "Preventive"]:
+            risk["SuggestedFix"] = "Monitor as part of regular review."
+    return list(risk_items)
@@ -0,0 +1,126 @@
+import os
+import math
+import logging
+import datetime
+import threading
+from concurrent.futures import Future
+from admission import suggestion_admission
+from history import get_history_risk, set_risk_suggestion, set_risk_suggestion_failed
+from metrics import SUGGESTION_REQUESTS
+from utils import (
+    generate_ai_suggestions, parse_suggested_actions, clear_suggestion_state,
+    SUGGESTION_PENDING, SUGGESTION_FAILED, SUGGESTION_ERROR
+)
+
+# After a failed generation the risk is not retried for this long, doubling
+# with each further failure up to the maximum
+SUGGESTION_RETRY_SECONDS = int(os.getenv("SUGGESTION_RETRY_SECONDS", 30))
+SUGGESTION_RETRY_MAX_SECONDS = int(os.getenv("SUGGESTION_RETRY_MAX_SECONDS", 900))
+
+logger = logging.getLogger(__name__)
+
+
+class SuggestionUnavailable(Exception):
+    """No suggestion can be generated right now; carries the Retry-After seconds."""
+
+    def __init__(self, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Could not generate suggestions right now. Please try again in {self.retry_after} seconds.")
+
+
+# (entry id, version, risk index) -> Future of the request generating it
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _needs_generation(risk):
+    """True if the risk's suggestion is still to be generated.
+
+    Raises SuggestionUnavailable while a failed risk is backing off.
+    """
+    status = risk.get("SuggestionStatus")
+    if status == SUGGESTION_FAILED:
+        retry_at = risk.get("SuggestionRetryAt")
+        wait = (retry_at - datetime.datetime.utcnow()).total_seconds() if retry_at else 0
+        if wait > 0:
+            SUGGESTION_REQUESTS.labels("backoff").inc()
+            raise SuggestionUnavailable(wait)
+        return True
+    if status != SUGGESTION_PENDING:
+        SUGGESTION_REQUESTS.labels("stored").inc()
+        return False
+    return True
+
+
+def get_risk_suggestion(user_id, entry_id, index):
+    """Return one stored risk, generating its pending suggestion on first request.
+
+    Returns None if the entry or risk does not exist. Concurrent requests for
+    the same pending risk share one LLM call: the first becomes the leader and
+    the others wait on its Future. Coalescing is per process; across
+    processes the guarded write in set_risk_suggestion keeps the first result.
+    The leader's call takes a suggestion admission slot (kept apart from
+    upload slots) and raises AdmissionRejected when none is free. A failed
+    call is stored with a backoff, during which requests raise
+    SuggestionUnavailable without calling the LLM.
+    """
+    found = get_history_risk(user_id, entry_id, index)
+    if found is None:
+        return None
+    version, risk = found
+    if not _needs_generation(risk):
+        return risk
+    key = (entry_id, version, index)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        SUGGESTION_REQUESTS.labels("coalesced").inc()
+        return future.result()
+    try:
+        suggestion_admission.admit(user_id)
+        try:
+            risk = _generate(user_id, entry_id, index)
+        finally:
+            suggestion_admission.release(user_id)
+        future.set_result(risk)
+        return risk
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _generate(user_id, entry_id, index):
+    # Read again as leader: a request that finished between our first read
+    # and taking the lock may already have stored the suggestion or a failure
+    found = get_history_risk(user_id, entry_id, index)
+    if found is None:
+        return None
+    version, risk = found
+    if not _needs_generation(risk):
+        return risk
+    suggested_fix = generate_ai_suggestions(risk)
+    if suggested_fix == SUGGESTION_ERROR:
+        attempts = risk.get("SuggestionAttempts", 0) + 1
+        delay = min(SUGGESTION_RETRY_SECONDS * 2 ** (attempts - 1), SUGGESTION_RETRY_MAX_SECONDS)
+        retry_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        set_risk_suggestion_failed(user_id, entry_id, version, index, attempts, retry_at)
+        SUGGESTION_REQUESTS.labels("failed").inc()
+        raise SuggestionUnavailable(delay)
+    recommended_actions = parse_suggested_actions(suggested_fix)
+    clear_suggestion_state(risk)
+    risk["SuggestedFix"] = suggested_fix
+    risk.setdefault("FMEA", {})["RecommendedActions"] = recommended_actions
+    if set_risk_suggestion(user_id, entry_id, version, index, suggested_fix, recommended_actions):
+        SUGGESTION_REQUESTS.labels("generated").inc()
+    else:
+        # Replaced by a new upload meanwhile; the suggestion is still valid for this risk
+        SUGGESTION_REQUESTS.labels("unsaved").inc()
+        logger.info(f"Suggestion for risk {index} of entry {entry_id} not stored: entry changed",
+                    extra={"entry_id": entry_id})
+    return risk
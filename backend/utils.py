@@ -1,302 +1,479 @@
-import fitz
-import docx
+import io
 import os
 import time
-import requests
+import shutil
+import tempfile
 import json
 import re
 import logging
-import datetime
-from pptx import Presentation
-from pymongo import MongoClient
-
-import os
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from llm_client import get_llm_client, LLMError
+from llm_cache import RiskAnalysisCache, make_cache_key
+from chunking import iter_chunks
+from prefilter import ChunkFilter
+from consolidation import cluster_risks, merge_cluster
+from db import collection
+from pdf_pages import open_pdf, extract_page_range
+from metrics import EXTRACTION_SECONDS, EXTRACTION_FAILURES, PARSE_FALLBACKS
+from request_context import submit_with_context
+from scoring import apply_fmea_scores, standard_severity
 from dotenv import load_dotenv
 load_dotenv()
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-mongo_db = client.PassionInfotech
-history_collection = mongo_db.AI_RISK
+history_collection = collection("AI_RISK")
+jobs_collection = collection("upload_jobs")
+
+# Uploads up to this size are extracted straight from memory
+UPLOAD_MAX_MEMORY_BYTES = int(os.getenv("UPLOAD_MAX_MEMORY_BYTES", 16 * 1024 * 1024))
+
+# PDF extraction: documents with at least PDF_PARALLEL_MIN_PAGES pages are
+# split into page ranges across PDF_EXTRACT_WORKERS processes
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 100))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", 1000))
+# Pages per worker task; bounds how much extracted text is buffered ahead
+PDF_PAGE_RANGE_SIZE = int(os.getenv("PDF_PAGE_RANGE_SIZE", 25))
+
+# Concurrent LLM calls per upload; the quota itself is enforced by the shared
+# limiter inside the LLM client (see llm_client.py)
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", 4))
+
+# Risk analysis settings; bump RISK_PROMPT_VERSION whenever the prompt changes
+RISK_ANALYSIS_TEMPERATURE = 0.4
+RISK_PROMPT_VERSION = "2"
+RISK_ANALYSIS_MAX_TOKENS = 1000
+
+# Chunk token budget: configured size, capped by what fits in the model context
+# next to the prompt template and the completion
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", 131072))
+RISK_PROMPT_OVERHEAD_TOKENS = 600
+CHUNK_MAX_TOKENS = min(
+    int(os.getenv("CHUNK_MAX_TOKENS", 1500)),
+    MODEL_CONTEXT_TOKENS - RISK_PROMPT_OVERHEAD_TOKENS - RISK_ANALYSIS_MAX_TOKENS
+)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 100))
+# About one paragraph in CHUNK_ANCHOR_DIVISOR ends a chunk early (0 disables)
+CHUNK_ANCHOR_DIVISOR = int(os.getenv("CHUNK_ANCHOR_DIVISOR", 4))
+
+# Local pre-filter in front of the LLM: chunks under PREFILTER_MIN_WORDS words
+# or scoring below PREFILTER_MIN_SCORE (0-1) on informativeness are skipped, as
+# are near-duplicates of an earlier chunk at PREFILTER_DUPLICATE_THRESHOLD
+# estimated Jaccard similarity (1 disables duplicate detection)
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() == "true"
+PREFILTER_MIN_SCORE = float(os.getenv("PREFILTER_MIN_SCORE", 0.3))
+PREFILTER_MIN_WORDS = int(os.getenv("PREFILTER_MIN_WORDS", 25))
+PREFILTER_DUPLICATE_THRESHOLD = float(os.getenv("PREFILTER_DUPLICATE_THRESHOLD", 0.85))
+
+# Risks from different chunks whose name+description TF-IDF cosine similarity
+# reaches RISK_MERGE_THRESHOLD are merged into one before suggestions
+RISK_MERGE_ENABLED = os.getenv("RISK_MERGE_ENABLED", "true").lower() == "true"
+RISK_MERGE_THRESHOLD = float(os.getenv("RISK_MERGE_THRESHOLD", 0.5))
+
+# Mitigation suggestions: risks per batched LLM call (1 disables batching)
+SUGGESTION_BATCH_SIZE = int(os.getenv("SUGGESTION_BATCH_SIZE", 5))
+SUGGESTION_MAX_TOKENS = 500
+# Generate Immediate/Preventive suggestions when a risk is first opened
+# (/api/history/<id>/risks/<index>/suggestions) instead of during the upload
+SUGGESTIONS_ON_DEMAND = os.getenv("SUGGESTIONS_ON_DEMAND", "true").lower() == "true"
+SUGGESTION_PENDING = "pending"
+# On-demand generation failed; retried after SuggestionRetryAt (see suggestions.py)
+SUGGESTION_FAILED = "failed"
+SUGGESTION_STATE_FIELDS = ("SuggestionStatus", "SuggestionAttempts", "SuggestionRetryAt")
+SUGGESTION_ERROR = "Error generating AI suggestions. Please review the risk manually."
+
+# Per-chunk analysis cache (in-process LRU in front of a TTL'd Mongo collection)
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+LLM_CACHE_TTL_DAYS = int(os.getenv("LLM_CACHE_TTL_DAYS", 30))
+analysis_cache = RiskAnalysisCache(collection("llm_cache"), LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_DAYS)
 
 # Utility and risk analysis functions
 
-def split_text(text, chunk_size=4000):
-    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+def buffer_upload(stream, max_memory_bytes=None):
+    """Read an uploaded file into memory, spilling to a temp file above the threshold.
 
-def extract_text_from_pdf(pdf_path):
+    Returns (source, temp_path): source is bytes for small uploads or the
+    temp file path for large ones, and temp_path is the file the caller must
+    remove (None when the upload stayed in memory).
+    """
+    if max_memory_bytes is None:
+        max_memory_bytes = UPLOAD_MAX_MEMORY_BYTES
+    data = stream.read(max_memory_bytes + 1)
+    if len(data) <= max_memory_bytes:
+        return data, None
+    fd, temp_path = tempfile.mkstemp(prefix="upload-")
     try:
-        doc = fitz.open(pdf_path)
-        text = "\n".join([page.get_text("text") for page in doc])
-        doc.close()
-        return text
-    except Exception as e:
-        return None
+        with os.fdopen(fd, "wb") as spill:
+            spill.write(data)
+            shutil.copyfileobj(stream, spill)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, temp_path
+
+def _as_file(source):
+    # Extractors accept a path, raw bytes or an open binary stream
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+def _pdf_mp_context():
+    # Forking a process that runs gthread request threads and job threads can
+    # copy held locks into the child; start workers from a clean process instead
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
 
-def extract_text_from_docx(docx_path):
+def iter_pdf_pages(source, max_pages=None, workers=None):
+    """Yield the text of each PDF page in order.
+
+    Documents with at least PDF_PARALLEL_MIN_PAGES pages are extracted in
+    PDF_PAGE_RANGE_SIZE-page ranges across worker processes, at most one range
+    per worker ahead of the consumer, so pages are never all held at once.
+    Workers open the file by path; an in-memory upload is written to a temp
+    file once rather than pickled to every range task. Documents longer than
+    max_pages are truncated to their first max_pages pages.
+    """
+    max_pages = PDF_MAX_PAGES if max_pages is None else max_pages
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    if hasattr(source, "read"):
+        source = source.read()
+    doc = open_pdf(source)
+    page_count = doc.page_count
+    if max_pages and page_count > max_pages:
+        logging.warning(f"PDF has {page_count} pages; extracting only the first {max_pages}")
+        page_count = max_pages
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        try:
+            for page_number in range(page_count):
+                yield doc[page_number].get_text("text")
+        finally:
+            doc.close()
+        return
+    doc.close()
+    temp_path = None
+    if isinstance(source, (bytes, bytearray)):
+        fd, temp_path = tempfile.mkstemp(prefix="pdf-", suffix=".pdf")
+        with os.fdopen(fd, "wb") as pdf_file:
+            pdf_file.write(source)
+        source = temp_path
+    ranges = iter([(start, min(start + PDF_PAGE_RANGE_SIZE, page_count))
+                   for start in range(0, page_count, PDF_PAGE_RANGE_SIZE)])
     try:
-        doc = docx.Document(docx_path)
-        return "\n".join([para.text for para in doc.paragraphs])
-    except Exception as e:
-        return None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pdf_mp_context()) as executor:
+            pending = deque(executor.submit(extract_page_range, source, start, stop)
+                            for start, stop in itertools.islice(ranges, workers))
+            while pending:
+                pages = pending.popleft().result()
+                for start, stop in itertools.islice(ranges, 1):
+                    pending.append(executor.submit(extract_page_range, source, start, stop))
+                yield from pages
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+def iter_docx_paragraphs(source):
+    import docx
+    doc = docx.Document(_as_file(source))
+    for para in doc.paragraphs:
+        yield para.text
+
+def iter_txt_lines(source):
+    if isinstance(source, (bytes, bytearray)) or hasattr(source, "read"):
+        lines = io.TextIOWrapper(_as_file(source), encoding="utf-8")
+    else:
+        lines = open(source, "r", encoding="utf-8")
+    with lines:
+        for line in lines:
+            yield line.rstrip("\n")
+
+def iter_pptx_texts(source):
+    from pptx import Presentation
+    presentation = Presentation(_as_file(source))
+    for slide in presentation.slides:
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                yield shape.text
 
-def extract_text_from_txt(txt_path):
+_SEGMENT_EXTRACTORS = {
+    "pdf": iter_pdf_pages,
+    "docx": iter_docx_paragraphs,
+    "txt": iter_txt_lines,
+    "ppt": iter_pptx_texts,
+    "pptx": iter_pptx_texts
+}
+
+SUPPORTED_EXTENSIONS = tuple(_SEGMENT_EXTRACTORS)
+
+class ExtractionError(Exception):
+    """Text extraction failed partway through a document."""
+
+def iter_text(source, file_extension):
+    """Yield a document's text lazily, one page, paragraph, shape or line at a time.
+
+    Joined with newlines the segments give the document's full text. An
+    extractor error raises ExtractionError rather than ending the stream, so a
+    partly read document is never analyzed as if it were complete; it and a
+    document that yields no text at all are counted as extraction failures.
+    """
+    extractor = _SEGMENT_EXTRACTORS.get(file_extension)
+    if extractor is None:
+        return
+    segments = extractor(source)
+    produced = False
+    failed = False
+    elapsed = 0.0
     try:
-        with open(txt_path, "r", encoding="utf-8") as file:
-            return file.read()
-    except Exception as e:
-        return None
+        while True:
+            started = time.perf_counter()
+            try:
+                segment = next(segments)
+            except StopIteration:
+                break
+            except Exception as e:
+                failed = True
+                logging.warning(f"Text extraction from .{file_extension} failed: {e}")
+                raise ExtractionError(str(e)) from e
+            finally:
+                elapsed += time.perf_counter() - started
+            produced = produced or bool(segment)
+            yield segment
+    finally:
+        segments.close()
+        EXTRACTION_SECONDS.labels(file_extension).observe(elapsed)
+        if failed or not produced:
+            EXTRACTION_FAILURES.labels(file_extension).inc()
+
+def list_archive_documents(source):
+    """Return [(member_name, uncompressed_size)] for the files in a ZIP upload.
+
+    Directories and macOS/hidden metadata entries are left out. Raises
+    zipfile.BadZipFile if source is not a ZIP archive.
+    """
+    import zipfile
+    with zipfile.ZipFile(_as_file(source)) as archive:
+        return [
+            (info.filename, info.file_size) for info in archive.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")
+            and not os.path.basename(info.filename).startswith(".")
+        ]
+
+def read_archive_member(source, member_name):
+    # Each caller opens its own handle, so members can be read from several threads
+    import zipfile
+    with zipfile.ZipFile(_as_file(source)) as archive:
+        return archive.read(member_name)
+
+def _risk_objects(parsed):
+    # The prompt asks for a single object; tolerate a list or a {"risks": [...]} wrapper
+    if isinstance(parsed, dict) and isinstance(parsed.get("risks"), list):
+        parsed = parsed["risks"]
+    if isinstance(parsed, dict):
+        return [parsed]
+    if isinstance(parsed, list) and parsed and all(isinstance(risk, dict) for risk in parsed):
+        return parsed
+    raise ValueError("Response is not a risk object")
+
+def _analysis_error_item(idx):
+    return {
+        "RiskID": f"RISK-ERR-{idx+1:03d}",
+        "RiskName": "API Response Parsing Error",
+        "RiskCategory": "Technical",
+        "RiskSeverity": "Low",
+        "RiskDescription": f"The API response for chunk {idx+1} could not be parsed as valid JSON.",
+        "Probability": "Medium",
+        "Impact": "Low",
+        "SecurityImplications": "None",
+        "TechnicalMitigation": "Review the JSON structure and fixing syntax errors in the API integration code",
+        "NonTechnicalMitigation": "Document this parsing issue and establish a review process for analyzing failed responses",
+        "ContingencyPlan": "Contact support if this error persists"
+    }
 
-def extract_text_from_pptx(pptx_path):
+def parse_analysis_response(content, idx):
+    """Decode one chunk's analysis response into risk dicts.
+
+    Returns (risks, outcome): "parsed" for valid JSON, "repaired" when the text
+    repair path recovered it, "error" when only a placeholder risk is left.
+    """
+    try:
+        return _risk_objects(json.loads(content)), "parsed"
+    except (json.JSONDecodeError, ValueError):
+        pass
     try:
-        presentation = Presentation(pptx_path)
-        text = []
-        for slide in presentation.slides:
-            for shape in slide.shapes:
-                if shape.has_text_frame:
-                    text.append(shape.text)
-        return "\n".join(text)
+        return _risk_objects(_repair_report(content)), "repaired"
     except Exception as e:
-        return None
+        PARSE_FALLBACKS.labels("invalid_llm_json").inc()
+        logging.warning(f"Risk analysis for chunk {idx+1} returned unparseable output: {e}")
+        return [_analysis_error_item(idx)], "error"
 
-def analyze_risks_with_groq(text):
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    chunks = split_text(text)
-    risk_reports = []
-    for idx, chunk in enumerate(chunks):
-        print(f"Analyzing chunk {idx+1}/{len(chunks)}...")
-        retry_attempts = 5
-        delay = 2
-        while retry_attempts > 0:
-            prompt = f"""
-            You are an AI specializing in risk assessment.
-            Given the following document section, analyze potential risks and return ONLY properly formatted JSON.
-            IMPORTANT FORMATTING INSTRUCTIONS:
-            1. Your response must contain ONLY a single valid JSON object
-            2. Do not include any explanatory text before or after the JSON
-            3. Do not use markdown code blocks or triple backticks (```) 
-            4. Make sure all keys and string values use double quotes, not single quotes
-            5. Make sure the JSON syntax is valid - test it carefully
-            Use exactly this JSON structure:
-            {{
-                "RiskID": "RISK-{idx+1:03d}",
-                "RiskName": "Brief name of the risk",
-                "RiskCategory": "Category such as security, compliance, feasibility, etc.",
-                "RiskSeverity": "Low/Medium/High/Critical",
-                "RiskDescription": "Detailed description of the identified risk",
-                "Probability": "Likelihood of occurrence (Low/Medium/High)",
-                "Impact": "Potential impact on the project (Low/Medium/High)",
-                "SecurityImplications": "Any security risks associated",
-                "TechnicalMitigation": "Specific technical controls, tools, or implementation details to address the risk",
-                "NonTechnicalMitigation": "Process changes, training, policies, and organizational measures to address the risk",
-                "ContingencyPlan": "Backup plan in case the risk occurs"
-            }}
-            IMPORTANT NOTES:
-            - Ensure a balanced distribution of risks across all severity levels (Low, Medium, High, Critical).
-            - Avoid overestimating severity unless justified by the context.
-            - Provide specific, actionable technical and non-technical mitigation strategies.
-            Document Section:
-            {chunk[:3500]}
-            """
-            payload = {
-                "model": "llama-3.3-70b-versatile",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.4,
-                "max_tokens": 1000,
-                "response_format": {"type": "json_object"}
-            }
-            try:
-                response = requests.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                content = response.json()["choices"][0]["message"]["content"]
+def _risk_prompt(idx, chunk):
+    return f"""
+    You are an AI specializing in risk assessment.
+    Given the following document section, analyze potential risks and return ONLY properly formatted JSON.
+    IMPORTANT FORMATTING INSTRUCTIONS:
+    1. Your response must contain ONLY a single valid JSON object
+    2. Do not include any explanatory text before or after the JSON
+    3. Do not use markdown code blocks or triple backticks (```) 
+    4. Make sure all keys and string values use double quotes, not single quotes
+    5. Make sure the JSON syntax is valid - test it carefully
+    Use exactly this JSON structure:
+    {{
+        "RiskID": "RISK-{idx+1:03d}",
+        "RiskName": "Brief name of the risk",
+        "RiskCategory": "Category such as security, compliance, feasibility, etc.",
+        "RiskSeverity": "Low/Medium/High/Critical",
+        "RiskDescription": "Detailed description of the identified risk",
+        "Probability": "Likelihood of occurrence (Low/Medium/High)",
+        "Impact": "Potential impact on the project (Low/Medium/High)",
+        "SecurityImplications": "Any security risks associated",
+        "TechnicalMitigation": "Specific technical controls, tools, or implementation details to address the risk",
+        "NonTechnicalMitigation": "Process changes, training, policies, and organizational measures to address the risk",
+        "ContingencyPlan": "Backup plan in case the risk occurs"
+    }}
+    IMPORTANT NOTES:
+    - Ensure a balanced distribution of risks across all severity levels (Low, Medium, High, Critical).
+    - Avoid overestimating severity unless justified by the context.
+    - Provide specific, actionable technical and non-technical mitigation strategies.
+    Document Section:
+    {chunk}
+    """
+
+def _analyze_chunk(idx, chunk):
+    """Return (risks, outcome) for one chunk; risks is None if the LLM call failed."""
+    llm = get_llm_client()
+    cache_key = make_cache_key(chunk, llm.model, RISK_PROMPT_VERSION, RISK_ANALYSIS_TEMPERATURE)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        try:
+            risks = _risk_objects(json.loads(cached))
+        except ValueError:
+            risks = None  # not a risk object; ask the model again
+        if risks:
+            # Cached responses may come from a different chunk position in another document
+            for risk in risks:
+                risk["RiskID"] = f"RISK-{idx+1:03d}"
+            return risks, "cached"
+    try:
+        content = llm.chat(
+            _risk_prompt(idx, chunk),
+            max_tokens=RISK_ANALYSIS_MAX_TOKENS,
+            temperature=RISK_ANALYSIS_TEMPERATURE,
+            json_mode=True,
+            purpose="risk_analysis"
+        )
+    except LLMError as e:
+        logging.warning(f"Risk analysis failed for chunk {idx+1}: {e}")
+        return None, "llm_error"
+    risks, outcome = parse_analysis_response(content, idx)
+    if outcome == "parsed":
+        analysis_cache.set(cache_key, content)
+    elif outcome == "repaired":
+        analysis_cache.set(cache_key, json.dumps(risks))
+    return risks, outcome
+
+def chunk_key(chunk):
+    """Content key of a chunk's analysis: identical text, model and prompt give the same risks."""
+    return make_cache_key(chunk, get_llm_client().model, RISK_PROMPT_VERSION, RISK_ANALYSIS_TEMPERATURE)
+
+def analyze_chunk_stream(pairs, on_progress=None, on_report=None, executor=None, max_pending=None):
+    """Analyze (idx, chunk) pairs as they are produced.
+
+    Chunks are pulled from pairs only while fewer than max_pending (twice the
+    worker count by default) are queued or in flight, so a lazily chunked
+    document is never held in memory whole. Returns (results, outcomes):
+    results maps idx to that chunk's risk dicts (None if its call failed) and
+    outcomes counts chunks by how their response was obtained (cached, parsed,
+    repaired, error, llm_error). on_progress(done) is called as chunks finish
+    and on_report(idx, risks) receives each chunk's risks as soon as they are
+    available. Passing an executor shares its workers with other documents
+    (batch uploads); otherwise a pool of GROQ_MAX_CONCURRENCY threads is used.
+    """
+    results = {}
+    outcomes = {"cached": 0, "parsed": 0, "repaired": 0, "error": 0, "llm_error": 0}
+    max_pending = max_pending or 2 * max(1, GROQ_MAX_CONCURRENCY)
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max(1, GROQ_MAX_CONCURRENCY))
+    pairs = iter(pairs)
+    pending = {}
+    exhausted = False
+    done = 0
+    try:
+        while True:
+            while not exhausted and len(pending) < max_pending:
                 try:
-                    json.loads(content)
-                    risk_reports.append(content)
-                except json.JSONDecodeError as je:
-                    risk_reports.append(json.dumps({
-                        "RiskID": f"RISK-ERR-{idx+1:03d}",
-                        "RiskName": "API Response Parsing Error",
-                        "RiskCategory": "Technical",
-                        "RiskSeverity": "Low",
-                        "RiskDescription": f"The API response for chunk {idx+1} could not be parsed as valid JSON.",
-                        "Probability": "Medium",
-                        "Impact": "Low",
-                        "SecurityImplications": "None",
-                        "TechnicalMitigation": "Review the JSON structure and fixing syntax errors in the API integration code",
-                        "NonTechnicalMitigation": "Document this parsing issue and establish a review process for analyzing failed responses",
-                        "ContingencyPlan": "Contact support if this error persists"
-                    }))
-                time.sleep(2)
-                break
-            except requests.exceptions.HTTPError as e:
-                if response.status_code == 429:
-                    time.sleep(delay)
-                    delay *= 2
-                    retry_attempts -= 1
-                else:
+                    idx, chunk = next(pairs)
+                except StopIteration:
+                    exhausted = True
                     break
-            except Exception as e:
-                retry_attempts -= 1
-                if retry_attempts <= 0:
-                    break
-    return "\n\n".join(risk_reports) if risk_reports else None
+                pending[submit_with_context(executor, _analyze_chunk, idx, chunk)] = idx
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                idx = pending.pop(future)
+                results[idx], outcome = future.result()
+                outcomes[outcome] += 1
+                done += 1
+                logging.info(f"Analyzed chunk {idx+1} ({done} done)",
+                             extra={"chunk": idx + 1, "chunks_done": done, "outcome": outcome})
+                if on_report and results[idx]:
+                    on_report(idx, results[idx])
+                if on_progress:
+                    on_progress(done)
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
+    return results, outcomes
 
-def parse_risk_reports(risk_report_text):
-    risk_items = []
-    reports = risk_report_text.split("\n\n")
-    for idx, report in enumerate(reports):
-        try:
-            try:
-                risk_item = json.loads(report)
-                risk_items.append(risk_item)
-                continue
-            except json.JSONDecodeError:
-                pass
-            json_text = None
-            if "```json" in report:
-                json_text = report.split("```json")[1].split("```", 1)[0].strip()
-            elif "```" in report:
-                json_text = report.split("```", 1)[1].split("```", 1)[0].strip()
-            else:
-                json_match = re.search(r'(\{.*\})', report, re.DOTALL)
-                if json_match:
-                    json_text = json_match.group(1).strip()
-                else:
-                    json_text = report.strip()
-            if json_text:
-                json_text = json_text.replace("'", '"')
-                json_text = re.sub(r'([{,])\s*(\w+):', r'\1 "\2":', json_text)
-                json_text = json_text.replace('None', 'null')
-                risk_item = json.loads(json_text)
-                risk_items.append(risk_item)
-            else:
-                raise ValueError("No JSON content found in report")
-        except (json.JSONDecodeError, ValueError) as e:
-            risk_items.append({
-                "RiskID": f"parsing-error-{idx+1}",
-                "RiskName": "Parsing Error",
-                "RiskDescription": f"Failed to parse JSON: {str(e)}.",
-                "RiskSeverity": "Unknown",
-                "RiskCategory": "Uncategorized",
-                "Probability": "Unknown",
-                "Impact": "Unknown",
-                "SecurityImplications": "Error parsing this risk report",
-                "TechnicalMitigation": "Review the raw text manually",
-                "NonTechnicalMitigation": "Establish process for handling parsing errors",
-                "ContingencyPlan": "Contact support if multiple parsing errors occur"
-            })
-        except Exception as e:
-            risk_items.append({
-                "RiskID": f"processing-error-{idx+1}",
-                "RiskName": "Processing Error",
-                "RiskDescription": f"Error: {str(e)}",
-                "RiskSeverity": "Unknown",
-                "RiskCategory": "Uncategorized",
-                "Probability": "Unknown",
-                "Impact": "Unknown",
-                "SecurityImplications": "Unknown",
-                "TechnicalMitigation": "Review manually",
-                "NonTechnicalMitigation": "Document issue",
-                "ContingencyPlan": "Retry processing"
-            })
-    return risk_items
+def new_chunk_filter():
+    """Pre-filter for one document's chunks, or None when PREFILTER_ENABLED is off."""
+    if not PREFILTER_ENABLED:
+        return None
+    return ChunkFilter(PREFILTER_MIN_SCORE, PREFILTER_MIN_WORDS, PREFILTER_DUPLICATE_THRESHOLD)
 
-def standardize_severity(severity):
-    if not severity:
-        return "Unknown"
-    severity = severity.lower()
-    if severity in ["red"]:
-        return "Critical"
-    elif severity in ["orange"]:
-        return "High"
-    elif severity in ["yellow"]:
-        return "Medium"
-    elif severity in ["green"]:
-        return "Low"
-    if "critical" in severity:
-        return "Critical"
-    elif "high" in severity:
-        return "High"
-    elif "medium" in severity or "med" in severity:
-        return "Medium"
-    elif "low" in severity:
-        return "Low"
-    else:
-        return "Unknown"
-
-def map_severity(severity):
-    if not severity or severity == "Unknown":
-        return 5
-    severity = str(severity).strip().lower()
-    if severity in ["critical", "red"]:
-        return 10
-    elif severity in ["high", "orange"]:
-        return 8
-    elif severity in ["medium", "med", "yellow"]:
-        return 6
-    elif severity in ["low", "green"]:
-        return 3
-    else:
-        return 5
-
-def map_occurrence(probability):
-    if not probability or probability == "Unknown":
-        return 5
-    probability = str(probability).strip().lower()
-    if probability in ["high", "very high", "certain"]:
-        return 10
-    elif probability in ["medium", "moderate", "likely"]:
-        return 6
-    elif probability in ["low", "unlikely", "rare"]:
-        return 3
-    else:
-        return 5
-
-def calculate_detectability(risk):
-    category = str(risk.get("RiskCategory", "")).strip().lower()
-    description = str(risk.get("RiskDescription", "")).lower()
-    technical_mitigation = str(risk.get("TechnicalMitigation", "")).lower()
-    if "security" in category:
-        base_score = 7
-    elif "technical" in category:
-        base_score = 6
-    elif "operational" in category:
-        base_score = 5
-    elif "compliance" in category or "legal" in category:
-        base_score = 4
+def chunk_stream(segments, spans=None):
+    """Lazily chunk a stream of text segments (see iter_text) with the configured budget.
+
+    spans, if given, collects each chunk's (first, last) segment indexes as in iter_chunks.
+    """
+    chunk_stats = {}
+    yield from iter_chunks(segments, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_ANCHOR_DIVISOR, chunk_stats, spans)
+    logging.info(f"Chunked document into {chunk_stats['chunks']} chunks", extra=chunk_stats)
+
+def _repair_report(report):
+    """Recover a JSON value from model output that is not valid JSON as-is.
+
+    Strips code fences or surrounding prose, then rewrites single quotes,
+    bare keys and None. Raises ValueError (or JSONDecodeError) if that fails.
+    """
+    if "```json" in report:
+        PARSE_FALLBACKS.labels("fenced_json").inc()
+        json_text = report.split("```json")[1].split("```", 1)[0].strip()
+    elif "```" in report:
+        PARSE_FALLBACKS.labels("fenced").inc()
+        json_text = report.split("```", 1)[1].split("```", 1)[0].strip()
     else:
-        base_score = 5
-    detection_terms = ["monitor", "alert", "logging", "audit", "detect", "scan", "dashboard", "tracking"]
-    control_count = sum(1 for term in detection_terms if term in description or term in technical_mitigation)
-    detection_adjustment = min(control_count, 4)
-    final_score = max(1, min(10, base_score - detection_adjustment))
-    return final_score
-
-def extract_current_controls(risk):
-    description = risk.get("RiskDescription", "")
-    technical = risk.get("TechnicalMitigation", "")
-    non_technical = risk.get("NonTechnicalMitigation", "")
-    control_indicators = [
-        "currently", "existing", "in place", "implemented", 
-        "already", "present", "established"
-    ]
-    controls = []
-    for text in [description, technical, non_technical]:
-        sentences = text.split(". ")
-        for sentence in sentences:
-            if any(indicator in sentence.lower() for indicator in control_indicators):
-                controls.append(sentence.strip())
-    if not controls:
-        return "No existing controls documented."
-    return " ".join(controls)
+        json_match = re.search(r'(\{.*\})', report, re.DOTALL)
+        if json_match:
+            PARSE_FALLBACKS.labels("embedded_json").inc()
+            json_text = json_match.group(1).strip()
+        else:
+            PARSE_FALLBACKS.labels("bare_text").inc()
+            json_text = report.strip()
+    if not json_text:
+        raise ValueError("No JSON content found in report")
+    json_text = json_text.replace("'", '"')
+    json_text = re.sub(r'([{,])\s*(\w+):', r'\1 "\2":', json_text)
+    json_text = json_text.replace('None', 'null')
+    return json.loads(json_text)
+
+def standardize_severity(severity):
+    return standard_severity(severity)
 
 def parse_suggested_actions(suggested_fix):
     if not suggested_fix or suggested_fix == "No immediate action required.":
@@ -328,74 +505,7 @@ def parse_suggested_actions(suggested_fix):
     return actions
 
 
-# Enhanced FMEA logic with tiered thresholds and action levels
-def calculate_rpn_and_suggest_fixes(risk_items):
-    RPN_HIGH = 200
-    RPN_MODERATE = 100
-    CN_HIGH = 70  # Severity (1-10) × Occurrence threshold
-    fmea_results = []
-    severity_distribution = {"Critical": 0, "High": 0, "Medium": 0, "Low": 0}
-    for risk in risk_items:
-        try:
-            severity = map_severity(risk.get("RiskSeverity", "Low"))
-            occurrence = map_occurrence(risk.get("Probability", "Low"))
-            detectability = calculate_detectability(risk)
-            rpn = severity * occurrence * detectability
-            cn = severity * occurrence
-            # Action level logic
-            if rpn >= RPN_HIGH or cn >= CN_HIGH or severity >= 9:
-                action_level = "Immediate"
-            elif rpn >= RPN_MODERATE or cn >= (CN_HIGH // 2):
-                action_level = "Preventive"
-            elif severity >= 8:
-                action_level = "ManualReview"
-            else:
-                action_level = "Monitor"
-            # Logging for debugging
-            print(f"Risk: {risk.get('RiskName')} - RPN: {rpn} (S:{severity}, O:{occurrence}, D:{detectability}), CN: {cn}, ActionLevel: {action_level}")
-            risk["FMEA"] = {
-                "Severity": severity,
-                "Occurrence": occurrence,
-                "Detection": detectability,
-                "RPN": rpn,
-                "CurrentControls": extract_current_controls(risk),
-                "RecommendedActions": [],
-                "ActionStatus": "Not Started",
-                "ResponsiblePerson": "",
-                "TargetDate": "",
-                "ActionTaken": "",
-                "UpdatedRPN": None,
-                "ActionLevel": action_level
-            }
-            risk["RPN"] = rpn
-            risk["ActionLevel"] = action_level
-            # Generate suggestions only for Immediate/Preventive
-            if action_level in ["Immediate", "Preventive"]:
-                suggested_actions = generate_ai_suggestions(risk)
-                risk["FMEA"]["RecommendedActions"] = parse_suggested_actions(suggested_actions)
-                risk["SuggestedFix"] = suggested_actions
-            elif action_level == "ManualReview":
-                risk["SuggestedFix"] = "Manual review required by risk team."
-            else:
-                risk["SuggestedFix"] = "Monitor as part of regular review."
-            severity_level = risk.get("RiskSeverity", "Unknown")
-            if severity_level in severity_distribution:
-                severity_distribution[severity_level] += 1
-            fmea_results.append(risk)
-        except Exception as e:
-            risk["RPN"] = 0
-            risk["SuggestedFix"] = f"Error calculating RPN: {e}"
-            fmea_results.append(risk)
-    return fmea_results
-
-def generate_ai_suggestions(risk):
-    try:
-        prompt = f"""
-        You are an AI specializing in risk mitigation strategies.
-        Given the following risk details, provide SPECIFIC, ACTIONABLE mitigation strategies.
-        
-        Format your response EXACTLY as follows - keep descriptions CONCISE (1-2 sentences max per item):
-        
+SUGGESTION_FORMAT = """
         TECHNICAL SOLUTIONS:
         1. [Solution name]: [Brief 1-2 sentence description highlighting KEY action and benefit]
         2. [Solution name]: [Brief 1-2 sentence description highlighting KEY action and benefit]
@@ -414,7 +524,90 @@ def generate_ai_suggestions(risk):
         5. [Recommendation]: [One concise sentence with the KEY point]
         
         IMPORTANT: Keep each description under 25 words. Focus on WHAT to do and WHY it matters, not lengthy explanations.
+"""
+
+def consolidate_risks(items_by_chunk, threshold=None, chunk_pages=None, also_from=None):
+    """Merge restatements of the same risk found in different chunks.
+
+    items_by_chunk maps chunk index to that chunk's scored risks; also_from
+    maps (chunk index, position) of a risk listed once but found in several
+    chunks (a merged risk carried over) to its other chunk indexes. Returns
+    (risks, chunk_risks, stats): the merged risks in first-seen order,
+    {chunk index: positions in risks} and before/after counts. Each merged
+    risk keeps the highest severity of its cluster and its source chunks, and
+    its source pages when chunk_pages gives each chunk's page span.
+    """
+    threshold = RISK_MERGE_THRESHOLD if threshold is None else threshold
+    also_from = also_from or {}
+    flat = []
+    chunk_numbers = []
+    for idx in sorted(items_by_chunk):
+        for position, item in enumerate(items_by_chunk[idx]):
+            flat.append(item)
+            chunk_numbers.append([idx + 1] + [other + 1 for other in also_from.get((idx, position), [])])
+    if RISK_MERGE_ENABLED:
+        clusters = cluster_risks(flat, threshold)
+    else:
+        clusters = [[i] for i in range(len(flat))]
+    clusters.sort(key=min)
+    risks = [merge_cluster(flat, cluster, chunk_numbers, chunk_pages) for cluster in clusters]
+    chunk_risks = {}
+    for position, cluster in enumerate(clusters):
+        for number in sorted({number for i in cluster for number in chunk_numbers[i]}):
+            chunk_risks.setdefault(number - 1, []).append(position)
+    stats = {"risks_found": len(flat), "risks_merged": len(flat) - len(risks), "risks_kept": len(risks)}
+    if stats["risks_merged"]:
+        logging.info(f"Merged {len(flat)} risks into {len(risks)}", extra=stats)
+    return risks, chunk_risks, stats
+
+def needs_ai_suggestion(risk):
+    return "FMEA" in risk and risk.get("ActionLevel") in ["Immediate", "Preventive"]
+
+def suggest_fixes(fmea_results):
+    """Generate AI suggestions for the scored risks that need them (Immediate/Preventive)."""
+    apply_ai_suggestions([risk for risk in fmea_results if needs_ai_suggestion(risk)])
+
+def clear_suggestion_state(risk):
+    for field in SUGGESTION_STATE_FIELDS:
+        risk.pop(field, None)
+
+def mark_suggestions_pending(risks):
+    """Flag risks whose AI suggestion is left to be generated on request.
+
+    A suggestion carried over from the previous version settles the risk; a
+    carried-over failure starts again as pending with a fresh backoff.
+    """
+    for risk in risks:
+        clear_suggestion_state(risk)
+        if "SuggestedFix" not in risk and needs_ai_suggestion(risk):
+            risk["SuggestionStatus"] = SUGGESTION_PENDING
+
+def apply_ai_suggestions(risks, batch_size=None):
+    """Fill SuggestedFix/RecommendedActions for risks, SUGGESTION_BATCH_SIZE risks per LLM call."""
+    batch_size = SUGGESTION_BATCH_SIZE if batch_size is None else batch_size
+    if not risks:
+        return
+    if batch_size <= 1:
+        suggestions = [generate_ai_suggestions(risk) for risk in risks]
+    else:
+        batches = [risks[i:i + batch_size] for i in range(0, len(risks), batch_size)]
+        workers = max(1, min(GROQ_MAX_CONCURRENCY, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [submit_with_context(executor, generate_ai_suggestions_batch, batch) for batch in batches]
+            suggestions = [s for future in futures for s in future.result()]
+    for risk, suggested_actions in zip(risks, suggestions):
+        risk["FMEA"]["RecommendedActions"] = parse_suggested_actions(suggested_actions)
+        risk["SuggestedFix"] = suggested_actions
+        clear_suggestion_state(risk)
+
+def generate_ai_suggestions(risk):
+    try:
+        prompt = f"""
+        You are an AI specializing in risk mitigation strategies.
+        Given the following risk details, provide SPECIFIC, ACTIONABLE mitigation strategies.
         
+        Format your response EXACTLY as follows - keep descriptions CONCISE (1-2 sentences max per item):
+{SUGGESTION_FORMAT}
         Risk Details:
         - Risk Name: {risk.get('RiskName', 'Unnamed Risk')}
         - Risk Category: {risk.get('RiskCategory', 'Uncategorized')}
@@ -423,26 +616,79 @@ def generate_ai_suggestions(risk):
         - Impact: {risk.get('Impact', 'Unknown')}
         - Risk Description: {risk.get('RiskDescription', 'No description provided')}
         """
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": "llama-3.3-70b-versatile",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.4,
-            "max_tokens": 500
-        }
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=payload
+        content = get_llm_client().chat(
+            prompt, max_tokens=SUGGESTION_MAX_TOKENS, temperature=0.4, purpose="suggestion"
         )
-        response.raise_for_status()
-        content = response.json()["choices"][0]["message"]["content"]
         return content.strip()
     except Exception as e:
-        return "Error generating AI suggestions. Please review the risk manually."
+        logging.warning(f"Suggestion call failed for {risk.get('RiskName', 'Unnamed Risk')}: {e}")
+        return SUGGESTION_ERROR
+
+def _suggestion_keys(risks):
+    # Keys must be unique within a batch even if the model reused a RiskID
+    keys = []
+    for position, risk in enumerate(risks):
+        key = str(risk.get("RiskID") or f"RISK-{position+1:03d}")
+        if key in keys:
+            key = f"{key}#{position+1}"
+        keys.append(key)
+    return keys
+
+def generate_ai_suggestions_batch(risks):
+    """Generate suggestions for several risks with one LLM call.
+
+    The model returns a JSON object keyed by RiskID whose values use the same
+    text layout as generate_ai_suggestions. Risks missing from the response
+    fall back to an individual call. Returns suggestions in input order.
+    """
+    keys = _suggestion_keys(risks)
+    details = "\n".join(
+        f"""
+        RiskID: {key}
+        - Risk Name: {risk.get('RiskName', 'Unnamed Risk')}
+        - Risk Category: {risk.get('RiskCategory', 'Uncategorized')}
+        - Risk Severity: {risk.get('RiskSeverity', 'Unknown')}
+        - Probability: {risk.get('Probability', 'Unknown')}
+        - Impact: {risk.get('Impact', 'Unknown')}
+        - Risk Description: {risk.get('RiskDescription', 'No description provided')}
+        """
+        for key, risk in zip(keys, risks)
+    )
+    prompt = f"""
+        You are an AI specializing in risk mitigation strategies.
+        For EACH of the risks below, provide SPECIFIC, ACTIONABLE mitigation strategies.
+
+        Return ONLY a single valid JSON object. Each key must be a RiskID from the list below
+        and each value must be a single string containing the mitigation text for that risk.
+        Use "\\n" for line breaks inside the strings.
+
+        Format each mitigation text EXACTLY as follows - keep descriptions CONCISE (1-2 sentences max per item):
+{SUGGESTION_FORMAT}
+        Risks:
+        {details}
+        """
+    suggestions = {}
+    try:
+        content = get_llm_client().chat(
+            prompt,
+            max_tokens=min(SUGGESTION_MAX_TOKENS * len(risks), 8000),
+            temperature=0.4,
+            json_mode=True,
+            purpose="suggestion_batch"
+        )
+        parsed = json.loads(content)
+        if isinstance(parsed, dict):
+            suggestions = parsed
+    except Exception as e:
+        logging.warning(f"Batched suggestion call failed for {len(risks)} risks: {e}")
+    results = []
+    for key, risk in zip(keys, risks):
+        text = suggestions.get(key)
+        if isinstance(text, str) and text.strip():
+            results.append(text.strip())
+        else:
+            results.append(generate_ai_suggestions(risk))
+    return results
 
 def calculate_overall_risk(risk_items):
     risk_levels = {"Critical": 4, "High": 3, "Medium": 2, "Low": 1}
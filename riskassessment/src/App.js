@@ -9,6 +9,7 @@ function App() {
   const [riskItems, setRiskItems] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [uploadedFileName, setUploadedFileName] = useState('');
+  const [historyEntryId, setHistoryEntryId] = useState(null);
 
   return (
     <BrowserRouter>
@@ -36,7 +37,9 @@ function App() {
                 isLoading,
                 setIsLoading,
                 uploadedFileName,
-                setUploadedFileName
+                setUploadedFileName,
+                historyEntryId,
+                setHistoryEntryId
               })}
             />
           ))}
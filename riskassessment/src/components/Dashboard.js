@@ -2,7 +2,7 @@ import React from 'react';
 import FileUpload from './FileUpload';
 import RiskDashboard from './RiskDashboard';
 
-const Dashboard = ({ riskItems, setRiskItems, isLoading, setIsLoading, uploadedFileName, setUploadedFileName }) => (
+const Dashboard = ({ riskItems, setRiskItems, isLoading, setIsLoading, uploadedFileName, setUploadedFileName, historyEntryId, setHistoryEntryId }) => (
   <main className="container mx-auto px-4 py-8">
     <div className="max-w-6xl mx-auto">
       <FileUpload 
@@ -10,11 +10,14 @@ const Dashboard = ({ riskItems, setRiskItems, isLoading, setIsLoading, uploadedF
         isLoading={isLoading} 
         setIsLoading={setIsLoading}
         setUploadedFileName={setUploadedFileName}
+        setHistoryEntryId={setHistoryEntryId}
       />
       {riskItems.length > 0 && (
         <RiskDashboard 
           riskItems={riskItems}
+          setRiskItems={setRiskItems}
           fileName={uploadedFileName}
+          historyEntryId={historyEntryId}
         />
       )}
       {!isLoading && riskItems.length === 0 && (
@@ -5,9 +5,39 @@ import { toast } from 'react-toastify';
 import { ClipLoader } from 'react-spinners';
 import { API_BASE_URL } from '../endpoints/api';
 
-const FileUpload = ({ setRiskItems, isLoading, setIsLoading, setUploadedFileName }) => {
+// Reads a text/event-stream response and calls onEvent(eventName, parsedData) per event.
+// fetch is used instead of EventSource because the stream needs the User-ID header.
+// offset is the number of risk events already received from earlier streams.
+const streamJobEvents = async (jobId, headers, offset, onEvent) => {
+  const response = await fetch(`${API_BASE_URL}/api/jobs/${jobId}/events?offset=${offset}`, { headers });
+  if (!response.ok || !response.body) {
+    throw new Error('Failed to open the analysis stream.');
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const rawEvent of events) {
+      let eventName = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) eventName = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (data) onEvent(eventName, JSON.parse(data));
+    }
+  }
+};
+
+const FileUpload = ({ setRiskItems, isLoading, setIsLoading, setUploadedFileName, setHistoryEntryId }) => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [isDragging, setIsDragging] = useState(false);
+  const [jobProgress, setJobProgress] = useState(null);
   const fileInputRef = useRef(null);
 
   const handleFileChange = (e) => {
@@ -84,25 +114,63 @@ const FileUpload = ({ setRiskItems, isLoading, setIsLoading, setUploadedFileName
     setIsLoading(true);
 
     try {
+      const headers = { 'User-ID': userId };
       const response = await axios.post(`${API_BASE_URL}/api/upload`, formData, {
         headers: {
+          ...headers,
           'Content-Type': 'multipart/form-data',
-          'User-ID': userId, // Include User-ID in the headers
         },
       });
 
-      if (response.data.success) {
-        setRiskItems(response.data.risk_items);
-        setUploadedFileName(selectedFile.name);
+      if (!response.data.success) {
+        toast.error('Failed to process the document.');
+        return;
+      }
+
+      // The backend analyzes the document in the background and streams each
+      // scored risk as a Server-Sent Event, ending with a summary event.
+      const jobId = response.data.job_id;
+      setRiskItems([]);
+      setHistoryEntryId(null);
+      setUploadedFileName(selectedFile.name);
+      let completed = false;
+      // Streams are time-limited by the server; a "reconnect" event carries
+      // the offset to resume from
+      let offset = 0;
+      let resume = true;
+      const handleEvent = (event, data) => {
+        if (event === 'risk') {
+          setRiskItems((prev) => [...prev, data]);
+        } else if (event === 'progress') {
+          setJobProgress(data.progress || null);
+        } else if (event === 'summary') {
+          setRiskItems(data.risk_items);
+          // Pending suggestions are requested per risk from the saved history entry
+          setHistoryEntryId(data.entry_id);
+          completed = true;
+        } else if (event === 'reconnect') {
+          offset = data.offset;
+          resume = true;
+        } else if (event === 'error') {
+          throw new Error(data.error || 'Failed to process the document.');
+        }
+      };
+      while (resume) {
+        resume = false;
+        await streamJobEvents(jobId, headers, offset, handleEvent);
+      }
+
+      if (completed) {
         toast.success('Risk assessment completed successfully!');
       } else {
-        toast.error('Failed to process the document.');
+        toast.error('Connection to the analysis stream was lost.');
       }
     } catch (error) {
       console.error('Error uploading file:', error);
-      toast.error(error.response?.data?.error || 'An error occurred while processing the file.');
+      toast.error(error.response?.data?.error || error.message || 'An error occurred while processing the file.');
     } finally {
       setIsLoading(false);
+      setJobProgress(null);
     }
   };
 
@@ -204,7 +272,9 @@ const FileUpload = ({ setRiskItems, isLoading, setIsLoading, setUploadedFileName
           {isLoading ? (
             <>
               <ClipLoader size={24} color="white" className="mr-3" />
-              Analyzing Document...
+              {jobProgress && jobProgress.chunks_total > 0
+                ? `Analyzing Document... (${jobProgress.chunks_done}/${jobProgress.chunks_total} sections)`
+                : 'Analyzing Document...'}
             </>
           ) : (
             'Start Risk Analysis'
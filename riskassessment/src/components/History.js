@@ -4,32 +4,57 @@ import { toast } from 'react-toastify';
 import { FaCalendarAlt, FaFileAlt, FaExclamationTriangle, FaInfoCircle, FaShieldAlt, FaCog, FaUsers, FaClipboardList } from 'react-icons/fa';
 import { API_BASE_URL } from '../endpoints/api';
 
+// SourcePages lists every PDF page a risk was found on; show runs as ranges
+const formatPages = (pages) => {
+  const runs = [];
+  pages.forEach((page) => {
+    const last = runs[runs.length - 1];
+    if (last && page === last[1] + 1) last[1] = page;
+    else runs.push([page, page]);
+  });
+  const label = runs.map(([start, end]) => (start === end ? `${start}` : `${start}–${end}`)).join(', ');
+  return `${pages.length === 1 ? 'Page' : 'Pages'} ${label}`;
+};
+
 const History = () => {
   const [history, setHistory] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [riskDetailsById, setRiskDetailsById] = useState({});
+  const [pendingSuggestions, setPendingSuggestions] = useState({});
+
+  const getUserId = () => {
+    const user = localStorage.getItem('user');
+    return user ? JSON.parse(user).id : null;
+  };
+
+  // History is paginated; each page holds summaries only, details are fetched per entry.
+  const fetchHistoryPage = async (cursor) => {
+    const userId = getUserId();
+    if (!userId) {
+      toast.error('User not logged in. Please log in to view your history.');
+      return;
+    }
+
+    const response = await axios.get(`${API_BASE_URL}/api/history`, {
+      headers: { 'User-ID': userId },
+      params: cursor ? { cursor } : {},
+    });
+
+    if (response.data.success) {
+      setHistory((prev) => (cursor ? [...prev, ...response.data.history] : response.data.history));
+      setNextCursor(response.data.next_cursor);
+    } else {
+      toast.error('Failed to fetch history.');
+    }
+  };
 
   useEffect(() => {
     const fetchHistory = async () => {
       try {
         setIsLoading(true);
-        const user = localStorage.getItem('user');
-        const userId = user ? JSON.parse(user).id : null;
-
-        if (!userId) {
-          toast.error('User not logged in. Please log in to view your history.');
-          setIsLoading(false);
-          return;
-        }
-
-        const response = await axios.get(`${API_BASE_URL}/api/history`, {
-          headers: { 'User-ID': userId },
-        });
-
-        if (response.data.success) {
-          setHistory(response.data.history);
-        } else {
-          toast.error('Failed to fetch history.');
-        }
+        await fetchHistoryPage(null);
       } catch (error) {
         console.error('Error fetching history:', error);
         toast.error('An error occurred while fetching your history.');
@@ -41,6 +66,56 @@ const History = () => {
     fetchHistory();
   }, []);
 
+  const handleLoadMore = async () => {
+    try {
+      setIsLoadingMore(true);
+      await fetchHistoryPage(nextCursor);
+    } catch (error) {
+      console.error('Error fetching history:', error);
+      toast.error('An error occurred while fetching your history.');
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  const handleDetailsToggle = async (item, isOpen) => {
+    if (!isOpen || riskDetailsById[item.id]) return;
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/history/${item.id}`, {
+        headers: { 'User-ID': getUserId() },
+      });
+      if (response.data.success) {
+        const details = response.data.entry.risk_summary?.details || [];
+        setRiskDetailsById((prev) => ({ ...prev, [item.id]: details }));
+      } else {
+        toast.error('Failed to load risk details.');
+      }
+    } catch (error) {
+      console.error('Error fetching history entry:', error);
+      toast.error('An error occurred while loading risk details.');
+    }
+  };
+
+  // Immediate/Preventive suggestions are generated on request and saved to the entry.
+  const handleGenerateSuggestions = async (entryId, riskIndex) => {
+    const key = `${entryId}:${riskIndex}`;
+    setPendingSuggestions((prev) => ({ ...prev, [key]: true }));
+    try {
+      const response = await axios.post(`${API_BASE_URL}/api/history/${entryId}/risks/${riskIndex}/suggestions`, null, {
+        headers: { 'User-ID': getUserId() },
+      });
+      setRiskDetailsById((prev) => ({
+        ...prev,
+        [entryId]: prev[entryId].map((risk, i) => (i === riskIndex ? response.data.risk : risk)),
+      }));
+    } catch (error) {
+      console.error('Error generating suggestions:', error);
+      toast.error(error.response?.data?.error || 'An error occurred while generating recommendations.');
+    } finally {
+      setPendingSuggestions((prev) => ({ ...prev, [key]: false }));
+    }
+  };
+
   const formatDate = (dateString) => {
   const options = { 
     year: 'numeric', 
@@ -76,7 +151,7 @@ const History = () => {
     return <FaInfoCircle className="text-blue-500" />;
   };
 
-  const RiskDetailCard = ({ risk, index }) => {
+  const RiskDetailCard = ({ risk, index, entryId }) => {
     const severityStyle = getRiskLevelStyle(risk.RiskSeverity);
     
     return (
@@ -97,6 +172,11 @@ const History = () => {
                 {risk.RiskCategory}
               </span>
             )}
+            {risk.SourcePages?.length > 0 && (
+              <span className="px-2 py-1 rounded-full text-xs font-medium bg-gray-100 text-gray-700 border border-gray-200">
+                {formatPages(risk.SourcePages)}
+              </span>
+            )}
           </div>
         </div>
 
@@ -183,6 +263,18 @@ const History = () => {
           </div>
         )}
 
+        {(risk.SuggestionStatus === 'pending' || risk.SuggestionStatus === 'failed') && (
+          <div className="mt-4">
+            <button
+              className="text-sm font-medium text-indigo-600 hover:underline disabled:opacity-50"
+              disabled={pendingSuggestions[`${entryId}:${index}`]}
+              onClick={() => handleGenerateSuggestions(entryId, index)}
+            >
+              {pendingSuggestions[`${entryId}:${index}`] ? 'Generating recommendations...' : 'Generate recommended actions'}
+            </button>
+          </div>
+        )}
+
         {risk.SuggestedFix && risk.SuggestedFix !== "No immediate action required." && (
           <div className="mt-4">
             <h5 className="font-medium text-gray-700 mb-2 flex items-center">
@@ -207,8 +299,7 @@ const History = () => {
   };
 
   const handleDelete = async (item, index) => {
-    const user = localStorage.getItem('user');
-    const userId = user ? JSON.parse(user).id : null;
+    const userId = getUserId();
     if (!userId) {
       toast.error('User not logged in.');
       return;
@@ -246,10 +337,11 @@ const History = () => {
         <div className="grid gap-6 lg:grid-cols-1">
           {history.map((item, index) => {
             const riskStyle = getRiskLevelStyle(item.risk_summary?.level);
-            const riskDetails = item.risk_summary?.details || [];
+            const riskCount = item.risk_count || 0;
+            const riskDetails = riskDetailsById[item.id];
 
             return (
-              <div key={index} className="bg-white rounded-xl shadow-md overflow-hidden transition-all hover:shadow-lg border border-gray-100">
+              <div key={item.id || index} className="bg-white rounded-xl shadow-md overflow-hidden transition-all hover:shadow-lg border border-gray-100">
                 <div className="bg-gradient-to-r from-indigo-700 to-purple-700 px-6 py-4 flex items-center justify-between">
                   <h3 className="text-xl font-semibold text-white truncate">{item.file_name}</h3>
                   <button
@@ -289,22 +381,27 @@ const History = () => {
                         {item.risk_summary.summary && (
                           <div className="text-sm mt-1">Summary: {item.risk_summary.summary}</div>
                         )}
-                        {Array.isArray(riskDetails) && (
-                          <div className="text-sm mt-2">
-                            <strong>Total Risks Identified:</strong> {riskDetails.length}
-                          </div>
-                        )}
+                        <div className="text-sm mt-2">
+                          <strong>Total Risks Identified:</strong> {riskCount}
+                        </div>
                       </div>
                       
-                      {Array.isArray(riskDetails) && riskDetails.length > 0 && (
-                        <details className="bg-gray-50 rounded-lg overflow-hidden border border-gray-200">
+                      {riskCount > 0 && (
+                        <details
+                          className="bg-gray-50 rounded-lg overflow-hidden border border-gray-200"
+                          onToggle={(e) => handleDetailsToggle(item, e.currentTarget.open)}
+                        >
                           <summary className="cursor-pointer px-4 py-3 text-indigo-700 font-medium hover:bg-gray-100 border-b border-gray-200">
-                            View Detailed Risk Analysis ({riskDetails.length} risks found)
+                            View Detailed Risk Analysis ({riskCount} risks found)
                           </summary>
                           <div className="p-4 max-h-96 overflow-y-auto">
-                            {riskDetails.map((risk, riskIndex) => (
-                              <RiskDetailCard key={riskIndex} risk={risk} index={riskIndex} />
-                            ))}
+                            {riskDetails ? (
+                              riskDetails.map((risk, riskIndex) => (
+                                <RiskDetailCard key={riskIndex} risk={risk} index={riskIndex} entryId={item.id} />
+                              ))
+                            ) : (
+                              <div className="animate-pulse text-indigo-600 text-sm">Loading risk details...</div>
+                            )}
                           </div>
                         </details>
                       )}
@@ -314,6 +411,17 @@ const History = () => {
               </div>
             );
           })}
+          {nextCursor && (
+            <div className="flex justify-center">
+              <button
+                onClick={handleLoadMore}
+                disabled={isLoadingMore}
+                className="bg-indigo-600 hover:bg-indigo-700 disabled:bg-gray-300 text-white px-6 py-2 rounded-lg shadow-md transition-colors"
+              >
+                {isLoadingMore ? 'Loading...' : 'Load More'}
+              </button>
+            </div>
+          )}
         </div>
       ) : (
         <div className="bg-white rounded-xl p-8 shadow-md text-center border border-gray-100">
@@ -1,4 +1,5 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
+import axios from 'axios';
 import { 
   FaChevronDown, 
   FaExclamationTriangle, 
@@ -13,9 +14,35 @@ import {
   FaInfoCircle,
   FaClipboard
 } from 'react-icons/fa';
+import { API_BASE_URL } from '../endpoints/api';
 
-const RiskCard = ({ risk }) => {
+const RiskCard = ({ risk, historyEntryId, riskIndex, onRiskUpdate }) => {
   const [isExpanded, setIsExpanded] = useState(false);
+  // A failure stored by the backend is only retried when the user asks
+  const [suggestionState, setSuggestionState] = useState(risk.SuggestionStatus === 'failed' ? 'failed' : 'idle');
+  const [suggestionError, setSuggestionError] = useState(null);
+  const isSuggestionPending = risk.SuggestionStatus === 'pending' || risk.SuggestionStatus === 'failed';
+
+  // Suggestions for Immediate/Preventive risks are generated the first time
+  // the card is opened and saved to the history entry by the backend.
+  useEffect(() => {
+    if (!isExpanded || !isSuggestionPending || !historyEntryId || riskIndex < 0 || suggestionState !== 'idle') return;
+    const user = localStorage.getItem('user');
+    const userId = user ? JSON.parse(user).id : null;
+    setSuggestionState('loading');
+    axios.post(`${API_BASE_URL}/api/history/${historyEntryId}/risks/${riskIndex}/suggestions`, null, {
+      headers: { 'User-ID': userId },
+    })
+      .then((response) => {
+        setSuggestionState('idle');
+        onRiskUpdate(riskIndex, response.data.risk);
+      })
+      .catch((error) => {
+        console.error('Error fetching suggestions:', error);
+        setSuggestionError(error.response?.data?.error || null);
+        setSuggestionState('failed');
+      });
+  }, [isExpanded, isSuggestionPending, historyEntryId, riskIndex, suggestionState, onRiskUpdate]);
   
   const {
     RiskID = 'Unknown ID',
@@ -114,6 +141,11 @@ const RiskCard = ({ risk }) => {
               <span className="bg-indigo-50 px-3 py-1.5 rounded-lg text-indigo-700 font-medium text-sm">
                 {RiskCategory}
               </span>
+              {risk.SourcePages?.length > 0 && (
+                <span className="bg-slate-100 px-3 py-1.5 rounded-lg text-slate-600 font-medium text-sm">
+                  {formatPages(risk.SourcePages)}
+                </span>
+              )}
               <span className={`font-semibold px-4 py-1.5 rounded-lg text-sm ${severityConfig.badgeColor}`}>
                 {RiskSeverity}
               </span>
@@ -197,6 +229,29 @@ const RiskCard = ({ risk }) => {
           />
           
           {/* AI Suggested Actions */}
+          {isSuggestionPending && (
+            <div className="mt-8 bg-gradient-to-r from-indigo-50 via-purple-50 to-blue-50 p-6 rounded-2xl border-l-4 border-indigo-500 shadow-sm">
+              <div className="flex items-center mb-4">
+                <div className="bg-indigo-100 p-3 rounded-full mr-4">
+                  <FaLightbulb className="text-indigo-600 text-xl" />
+                </div>
+                <h4 className="text-xl font-bold text-indigo-800">AI-Recommended Action Plan</h4>
+              </div>
+              {suggestionState === 'failed' ? (
+                <p className="text-slate-700">
+                  {suggestionError || 'Could not generate recommendations.'}{' '}
+                  <button
+                    className="text-indigo-600 font-medium hover:underline"
+                    onClick={() => setSuggestionState('idle')}
+                  >
+                    Try again
+                  </button>
+                </p>
+              ) : (
+                <p className="animate-pulse text-indigo-600">Generating recommendations...</p>
+              )}
+            </div>
+          )}
           {SuggestedFix !== 'No immediate action required.' && SuggestedFix !== 'No suggestion available' && (
             <div className="mt-8 bg-gradient-to-r from-indigo-50 via-purple-50 to-blue-50 p-6 rounded-2xl border-l-4 border-indigo-500 shadow-sm">
               <div className="flex items-center mb-6">
@@ -388,6 +443,18 @@ const FallbackFormat = ({ fix }) => {
 };
 
 // Helper function for severity configuration
+// SourcePages lists every PDF page a risk was found on; show runs as ranges
+const formatPages = (pages) => {
+  const runs = [];
+  pages.forEach((page) => {
+    const last = runs[runs.length - 1];
+    if (last && page === last[1] + 1) last[1] = page;
+    else runs.push([page, page]);
+  });
+  const label = runs.map(([start, end]) => (start === end ? `${start}` : `${start}–${end}`)).join(', ');
+  return `${pages.length === 1 ? 'Page' : 'Pages'} ${label}`;
+};
+
 const getSeverityConfig = (severity) => {
   const configs = {
     critical: {
@@ -49,7 +49,7 @@ const SEVERITY_CONFIG = {
   }
 };
 
-const RiskDashboard = ({ riskItems, fileName }) => {
+const RiskDashboard = ({ riskItems, setRiskItems, fileName, historyEntryId }) => {
   const [selectedSeverity, setSelectedSeverity] = useState(Object.keys(SEVERITY_CONFIG));
   const [selectedCategories, setSelectedCategories] = useState([]);
   const [searchQuery, setSearchQuery] = useState('');
@@ -331,9 +331,22 @@ const RiskDashboard = ({ riskItems, fileName }) => {
         {/* Risk Cards Section */}
         <div className="space-y-6">
           {filteredRisks.length > 0 ? (
-            filteredRisks.map((risk, index) => (
-              <RiskCard key={risk.RiskID || `risk-${index}`} risk={risk} />
-            ))
+            filteredRisks.map((risk) => {
+              // RiskID names the source chunk, so several risks (and streamed
+              // items) share one; the position in riskItems is unique
+              const riskIndex = riskItems.indexOf(risk);
+              return (
+                <RiskCard
+                  key={`${risk.RiskID || 'risk'}-${riskIndex}`}
+                  risk={risk}
+                  historyEntryId={historyEntryId}
+                  riskIndex={riskIndex}
+                  onRiskUpdate={(riskIndex, updated) =>
+                    setRiskItems((prev) => prev.map((item, i) => (i === riskIndex ? updated : item)))
+                  }
+                />
+              );
+            })
           ) : (
             <div className="bg-white/80 backdrop-blur-sm rounded-2xl shadow-xl p-16 text-center border border-white/20">
               <div className="bg-gradient-to-br from-gray-100 to-gray-200 p-8 rounded-full inline-block mb-6">